@@ -1,50 +1,35 @@
-import os
 import streamlit as st
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
 from PIL import Image
-import numpy as np
 
-# Configuration
-MODEL_PATH = 'model/plant_disease_model.pth'
-IMG_SIZE = (224, 224)
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Same predictor core as the API: model spec (160x160 MobileNetV2), preprocessing,
+# rejection threshold, micro-batching across sessions and the result cache
+from backend.batching import BatchScheduler
+from backend.cache import PredictionCache, content_digest
+from backend.ml_utils import predictor
 
-# Load Class Names
-def get_class_names():
-    if os.path.exists('model/class_indices.npy'):
-        return np.load('model/class_indices.npy', allow_pickle=True)
-    return []
+# Configuration
+MAX_BATCH_SIZE = 8
+MAX_WAIT_MS = 5.0
+CACHE_SIZE = 256
 
-# Load Model
+# Load Model (once per server process, shared by every session)
 @st.cache_resource
-def load_trained_model(num_classes):
-    if not os.path.exists(MODEL_PATH):
-        return None
-    
-    # Recreate the model architecture
-    model = models.mobilenet_v2(weights=None) # Weights not needed for inference, we load state_dict
-    model.classifier[1] = nn.Linear(model.last_channel, num_classes)
-    
+def _load_predictor():
+    # Raising keeps a failed load out of the cache, so the next run retries
+    if not predictor.load(retry=True):
+        raise RuntimeError(predictor.error or "model not loaded")
+    predictor.start_watching() # pick up newly activated registry versions, like the API
+    scheduler = BatchScheduler(predictor, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+    return scheduler, PredictionCache(predictor, maxsize=CACHE_SIZE)
+
+def load_predictor():
+    """(scheduler, cache), or None after showing why the model could not be loaded."""
     try:
-        model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-        model = model.to(DEVICE)
-        model.eval()
-        return model
-    except Exception as e:
-        st.error(f"Failed to load model: {e}")
+        return _load_predictor()
+    except RuntimeError as e:
+        st.error(f"Model not loaded: {e}. Please run train.py first to generate the model.")
         return None
 
-# Preprocessing
-def preprocess_image(image):
-    transform = transforms.Compose([
-        transforms.Resize(IMG_SIZE),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
-    return transform(image).unsqueeze(0).to(DEVICE)
-
 st.set_page_config(page_title="Plant Disease Prediction", page_icon="🌿")
 
 st.title("🌿 Plant Disease Prediction System")
@@ -56,41 +41,36 @@ Supported crops: Potato, Tomato, Pepper, etc.
 uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
 
 if uploaded_file is not None:
+    data = uploaded_file.getvalue()
     image = Image.open(uploaded_file).convert('RGB')
     st.image(image, caption='Uploaded Image', use_column_width=True)
     
     if st.button('Predict'):
-        class_indices = get_class_names()
-        if len(class_indices) == 0:
-            st.error("Class indices not found! Please run train.py first.")
-        else:
-            model = load_trained_model(len(class_indices))
-            
-            if model is None:
-                st.error("Model not found! Please run train.py first to generate the model.")
-            else:
-                with st.spinner('Analyzing...'):
-                    input_tensor = preprocess_image(image)
-                    
-                    with torch.no_grad():
-                        outputs = model(input_tensor)
-                        probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                        
-                    confidence, predicted_idx = torch.max(probabilities, 1)
-                    confidence = confidence.item() * 100
-                    predicted_label = class_indices[predicted_idx.item()]
+        loaded = load_predictor()
+        if loaded is not None:
+            scheduler, cache = loaded
+            with st.spinner('Analyzing...'):
+                result = cache.predict(content_digest(data), data, scheduler)
 
-                    st.success(f"**Prediction:** {predicted_label}")
-                    st.info(f"**Confidence:** {confidence:.2f}%")
-                    
-                    # Determine status
-                    if "healthy" in predicted_label.lower():
-                        st.balloons()
-                        st.write("✅ **Status:** Healthy Plant")
-                    else:
-                        st.warning("⚠️ **Status:** Diseased Plant")
-                        st.markdown("### Recommendation")
-                        st.write("Consult an agricultural expert for appropriate treatment.")
+            if isinstance(result, tuple):
+                st.error(f"Prediction failed: {result[0]['error']}")
+            elif result["status"] == "rejected":
+                st.warning(f"**Prediction:** {result['prediction']}")
+                st.info(f"**Confidence:** {result['confidence']:.2f}%")
+                st.write(result["details"])
+            else:
+                predicted_label = result["prediction"]
+                st.success(f"**Prediction:** {predicted_label}")
+                st.info(f"**Confidence:** {result['confidence']:.2f}%")
+                
+                # Determine status
+                if "healthy" in predicted_label.lower():
+                    st.balloons()
+                    st.write("✅ **Status:** Healthy Plant")
+                else:
+                    st.warning("⚠️ **Status:** Diseased Plant")
+                    st.markdown("### Recommendation")
+                    st.write("Consult an agricultural expert for appropriate treatment.")
 
 st.markdown("---")
 st.markdown("Developed for Plant Disease Detection Project")
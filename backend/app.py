@@ -1,5 +1,10 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory
+import io
+import json
+import time
+import threading
+import logging
+from flask import Flask, Response, abort, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -7,38 +12,207 @@ load_dotenv() # Load environment variables from .env file
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_bcrypt import Bcrypt
 from werkzeug.utils import secure_filename
-import uuid
+from sqlalchemy.exc import IntegrityError
+import base64
+import click
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from .config import Config
-from .models import db, User, Prediction
+from .models import db, User, Prediction, PredictionJob
+from .schema import upgrade_schema
+from .database import configure_engine
 from .ml_utils import predictor
+from .batching import BatchScheduler
+from .jobs import DB_COMMIT_SECONDS, JobQueue, QueueFull, fail_stale_jobs
+from .cache import PredictionCache, TTLCache, content_digest
+from .auth import AUTH_ATTEMPTS, USER_CACHE_HITS, USER_CACHE_MISSES, CachedUser, HasherBusy, PasswordHasher
+from .metrics import registry
+from . import thumbnails
+from .storage import LocalStorage
+from .lifecycle import UploadReclaimer
+from . import stats
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+logging.basicConfig(level=app.config['LOG_LEVEL'], format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Total time spent handling a request, by endpoint",
+    labelnames=("endpoint",),
+)
+UPLOAD_SAVE_SECONDS = registry.histogram("predict_upload_save_seconds", "Time to write one upload to disk")
+
 # Initialize Extensions
 CORS(app) # Allow all for development
 db.init_app(app)
+with app.app_context():
+    configure_engine(db.engine, app.config)
 jwt = JWTManager(app)
 bcrypt = Bcrypt(app)
 
-# Create DB Tables on startup
-with app.app_context():
-    db.create_all()
+# bcrypt runs on a bounded pool so a burst of logins cannot take every request thread
+hasher = PasswordHasher(
+    bcrypt,
+    log_rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    max_workers=app.config['AUTH_HASH_WORKERS'],
+    max_pending=app.config['AUTH_HASH_MAX_PENDING'],
+)
+
+# Recently looked-up users by email, so repeated logins skip the users query
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL_SECONDS'])
+
+# Groups concurrent /api/predict calls into batched forward passes
+scheduler = BatchScheduler(
+    predictor,
+    max_batch_size=app.config['PREDICT_MAX_BATCH_SIZE'],
+    max_wait_ms=app.config['PREDICT_MAX_WAIT_MS'],
+)
+
+# Results for previously seen images, keyed on content hash
+prediction_cache = PredictionCache(predictor, maxsize=app.config['PREDICTION_CACHE_SIZE'])
+
+# Parallel image decoding for /api/predict/batch (PIL releases the GIL)
+decode_pool = ThreadPoolExecutor(max_workers=app.config['DECODE_WORKERS'], thread_name_prefix="decode")
+
+# Uploads and their thumbnails, sharded by content hash
+storage = LocalStorage(app.config['UPLOAD_FOLDER'])
+
+# Deletes upload files no prediction refers to any more
+reclaimer = UploadReclaimer(
+    app,
+    storage,
+    interval_seconds=app.config['UPLOAD_RECLAIM_INTERVAL_SECONDS'],
+    grace_seconds=app.config['UPLOAD_ORPHAN_GRACE_SECONDS'],
+    retention_days=app.config['UPLOAD_RETENTION_DAYS'],
+    stale_job_seconds=app.config['JOB_STALE_SECONDS'],
+)
+
+# Writes uploads (and their thumbnails) to disk after the response has been computed
+upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-writer")
+
+# Background pool for /api/predict?async=1
+job_queue = JobQueue(
+    app,
+    lambda filename: run_inference(
+        filename.rsplit('.', 1)[0],
+        storage.path(filename),
+    ),
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+)
+
+# Open /api/jobs/<id>/stream responses in this process; each one holds a request thread
+job_streams = threading.BoundedSemaphore(max(1, app.config['JOB_STREAM_MAX_PER_WORKER']))
+
+# Warm up at the batch sizes the scheduler will actually run
+predictor.warmup_batch_sizes = sorted({1, app.config['PREDICT_MAX_BATCH_SIZE']})
+
+def start_model_load():
+    """Begin loading the model according to MODEL_LOAD (no-op once started)."""
+    if app.config['MODEL_LOAD'] == 'sync':
+        predictor.load()
+        predictor.start_watching()
+    elif app.config['MODEL_LOAD'] == 'background':
+        predictor.load_in_background()
+
+def sweep_stale_jobs():
+    """Fail async jobs that a restarted worker left queued or running."""
+    with app.app_context():
+        try:
+            failed = fail_stale_jobs(app.config['JOB_STALE_SECONDS'])
+        except Exception:
+            app.logger.exception("Stale job sweep failed")
+            return
+    if failed:
+        app.logger.warning("⚠️ Marked %d interrupted prediction jobs as failed", failed)
+
+_worker_lock = threading.Lock()
+_worker_pid = None
+
+def start_worker():
+    """Start this process's background work: model load, upload reclaimer, stale job sweep.
+
+    Runs once per process. Nothing starts at import: gunicorn may import the
+    app in its master before forking, where no threads may be started, and
+    CLI commands (init-db, backfill-stats, ...) must not load the model.
+    gunicorn.conf.py calls this in each worker; other servers get it from
+    their first request.
+    """
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    start_model_load()
+    reclaimer.start()
+    sweep_stale_jobs()
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+def model_unavailable():
+    """A 503 response if the model is not ready within MODEL_WAIT_SECONDS, else None."""
+    if predictor.wait_until_ready(app.config['MODEL_WAIT_SECONDS']):
+        return None
+    if predictor.status == 'failed':
+        return jsonify({"message": "Model failed to load", "error": predictor.error}), 503
+    response = jsonify({"message": "Model is still loading, try again shortly"})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # flask run and the test client have no worker hook (no-op after the first request)
+    start_worker()
+
+@app.after_request
+def record_request_time(response):
+    # Streaming responses (SSE) are timed until their first byte, not until they close
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unmatched')
+    return response
+
 # ==============================
 # AUTH ROUTES
 # ==============================
 
+def find_user(email):
+    """CachedUser for ``email`` (or None), from the user cache when possible."""
+    user = user_cache.get(email)
+    if user is not None:
+        USER_CACHE_HITS.inc()
+        return user
+    USER_CACHE_MISSES.inc()
+    row = User.query.filter_by(email=email).first()
+    if row is None:
+        # Not cached: the email may be registered by another worker any moment
+        return None
+    user = CachedUser.from_model(row)
+    user_cache.put(email, user)
+    return user
+
+def hasher_busy():
+    response = jsonify({"message": "Too many sign-in attempts right now, try again shortly"})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
+def save_rehashed_password(user_id, email, password_hash):
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == user_id).values(password_hash=password_hash))
+        db.session.commit()
+    user_cache.pop(email)
+
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -47,17 +221,31 @@ def register():
     password = data.get('password')
 
     if not name or not email or not password:
+        AUTH_ATTEMPTS.inc(endpoint="register", outcome="invalid")
         return jsonify({"message": "Missing required fields"}), 400
 
-    if User.query.filter_by(email=email).first():
+    if find_user(email):
+        AUTH_ATTEMPTS.inc(endpoint="register", outcome="exists")
         return jsonify({"message": "Email already registered"}), 409
 
-    hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_pw = hasher.hash(password)
+    except HasherBusy:
+        AUTH_ATTEMPTS.inc(endpoint="register", outcome="busy")
+        return hasher_busy()
     new_user = User(name=name, email=email, password_hash=hashed_pw)
     
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Registered concurrently, between the lookup and the insert
+        db.session.rollback()
+        AUTH_ATTEMPTS.inc(endpoint="register", outcome="exists")
+        return jsonify({"message": "Email already registered"}), 409
 
+    user_cache.put(email, CachedUser.from_model(new_user))
+    AUTH_ATTEMPTS.inc(endpoint="register", outcome="created")
     return jsonify({"message": "User newly registered success"}), 201
 
 @app.route('/api/login', methods=['POST'])
@@ -66,9 +254,22 @@ def login():
     email = data.get('email')
     password = data.get('password')
 
-    user = User.query.filter_by(email=email).first()
+    user = find_user(email) if email else None
+
+    try:
+        valid = user is not None and bool(password) and hasher.check(user.password_hash, password)
+    except HasherBusy:
+        AUTH_ATTEMPTS.inc(endpoint="login", outcome="busy")
+        return hasher_busy()
 
-    if user and bcrypt.check_password_hash(user.password_hash, password):
+    if valid:
+        AUTH_ATTEMPTS.inc(endpoint="login", outcome="success")
+        if hasher.needs_rehash(user.password_hash):
+            # BCRYPT_LOG_ROUNDS changed: upgrade the stored hash after responding
+            try:
+                hasher.rehash_later(password, lambda new_hash: save_rehashed_password(user.id, user.email, new_hash))
+            except HasherBusy:
+                pass # next login tries again
         # Create JWT
         access_token = create_access_token(identity=str(user.id))
         return jsonify({
@@ -77,12 +278,46 @@ def login():
             "user": user.to_dict()
         }), 200
     
+    AUTH_ATTEMPTS.inc(endpoint="login", outcome="invalid")
     return jsonify({"message": "Invalid credentials"}), 401
 
 # ==============================
 # PREDICTION ROUTES
 # ==============================
 
+def read_upload(file):
+    """Read an upload into memory, returning (filename, data, digest).
+
+    Uploads are named by content hash, so identical images map to one file.
+    """
+    data = file.read()
+    digest = content_digest(data)
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    return f"{digest}.{ext}", data, digest
+
+def persist_upload(unique_filename, data):
+    with UPLOAD_SAVE_SECONDS.time():
+        return storage.save(unique_filename, data)
+
+def generate_thumbnails(unique_filename, data=None):
+    try:
+        thumbnails.generate(storage, unique_filename, io.BytesIO(data) if data else None)
+    except Exception:
+        app.logger.exception("Could not generate thumbnails for %s", unique_filename)
+
+def save_upload(unique_filename, data):
+    persist_upload(unique_filename, data)
+    generate_thumbnails(unique_filename, data)
+
+def persist_upload_later(unique_filename, data):
+    """Write the upload and its thumbnails off the request path (or not at all if PERSIST_UPLOADS is off)."""
+    if app.config['PERSIST_UPLOADS']:
+        upload_pool.submit(save_upload, unique_filename, data)
+
+def run_inference(digest, source):
+    """Predict on an image path, bytes or buffer, serving repeated images from the cache."""
+    return prediction_cache.predict(digest, source, scheduler)
+
 @app.route('/api/predict', methods=['POST'])
 @jwt_required()
 def predict():
@@ -95,51 +330,341 @@ def predict():
         return jsonify({"message": "No selected file"}), 400
         
     if file and allowed_file(file.filename):
-        # Save file with unique name
+        unavailable = model_unavailable()
+        if unavailable:
+            return unavailable
+
         user_id = get_jwt_identity()
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
+        unique_filename, data, digest = read_upload(file)
+
+        # Async mode: queue the job and let the client poll /api/jobs/<id>
+        if request.args.get('async') in ('1', 'true'):
+            # The job reads its input from disk, so this write stays synchronous
+            persist_upload(unique_filename, data)
+            upload_pool.submit(generate_thumbnails, unique_filename, data)
+            try:
+                job = job_queue.submit(int(user_id), unique_filename)
+            except QueueFull:
+                response = jsonify({"message": "Prediction queue is full, try again later"})
+                response.headers['Retry-After'] = '5'
+                return response, 503
+            return jsonify({
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.id}"
+            }), 202
 
-        # Run Inference
-        result = predictor.predict(filepath)
+        # Run Inference straight from memory
+        result = run_inference(digest, data)
         
         # Determine strict status
         if isinstance(result, tuple): # Error case
             return jsonify(result[0]), result[1]
 
+        persist_upload_later(unique_filename, data)
+
         # Save to DB
         new_prediction = Prediction(
             user_id=int(user_id),
             image_path=unique_filename,
             prediction=result['prediction'],
-            confidence=result['confidence']
+            confidence=result['confidence'],
+            model_version=result.get('model_version'),
+            created_at=datetime.utcnow()
         )
-        db.session.add(new_prediction)
-        db.session.commit()
+        with DB_COMMIT_SECONDS.time(source="predict"):
+            db.session.add(new_prediction)
+            stats.record_inserted(db.session, [new_prediction])
+            db.session.commit()
 
         return jsonify(result), 200
 
     return jsonify({"message": "Invalid file type"}), 400
 
+@app.route('/api/predict/batch', methods=['POST'])
+@jwt_required()
+def predict_batch():
+    # Must be set before the form is parsed
+    request.max_content_length = app.config['BATCH_MAX_CONTENT_LENGTH']
+    files = request.files.getlist('images')
+
+    if not files:
+        return jsonify({"message": "No images part"}), 400
+
+    if len(files) > app.config['BATCH_MAX_IMAGES']:
+        return jsonify({"message": f"Too many images (max {app.config['BATCH_MAX_IMAGES']})"}), 400
+
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+
+    user_id = int(get_jwt_identity())
+    results = [None] * len(files)
+    filenames = [None] * len(files)
+    uploads = [None] * len(files)
+    misses = [] # (index, digest, data)
+    duplicates = [] # (index, index of the identical image being predicted)
+    first_seen = {}
+
+    for i, file in enumerate(files):
+        if file.filename == '':
+            results[i] = {"error": "No selected file"}
+        elif not allowed_file(file.filename):
+            results[i] = {"error": "Invalid file type"}
+        else:
+            filenames[i], uploads[i], digest = read_upload(file)
+            if digest in first_seen:
+                duplicates.append((i, first_seen[digest]))
+                continue
+            first_seen[digest] = i
+            results[i] = prediction_cache.get(digest)
+            if results[i] is None:
+                misses.append((i, digest, uploads[i]))
+
+    # Decode in parallel, then hand every image to the scheduler so they
+    # run as full batches rather than one forward pass per image
+    decoded = [decode_pool.submit(predictor.preprocess, data) for _, _, data in misses]
+    pending = []
+    for (i, digest, _), future in zip(misses, decoded):
+        try:
+            pending.append((i, digest, scheduler.submit(future.result())))
+        except Exception as e:
+            results[i] = {"error": str(e)}
+
+    for i, digest, future in pending:
+        result = future.result()
+        if isinstance(result, tuple): # Error case
+            results[i] = result[0]
+            continue
+        results[i] = result
+        prediction_cache.put(digest, result)
+
+    for i, original in duplicates:
+        results[i] = results[original]
+
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "image_path": filenames[i],
+            "prediction": result['prediction'],
+            "confidence": result['confidence'],
+            "model_version": result.get('model_version'),
+            "created_at": created_at
+        }
+        for i, result in enumerate(results)
+        if 'error' not in result
+    ]
+
+    for i, result in enumerate(results):
+        if 'error' not in result:
+            persist_upload_later(filenames[i], uploads[i])
+
+    # One multi-row INSERT and a single commit for the whole upload
+    if rows:
+        with DB_COMMIT_SECONDS.time(source="batch"):
+            db.session.execute(db.insert(Prediction), rows)
+            stats.record_inserted(db.session, rows)
+            db.session.commit()
+
+    return jsonify({
+        "results": [
+            {"index": i, "filename": file.filename, **result}
+            for i, (file, result) in enumerate(zip(files, results))
+        ]
+    }), 200
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    user_id = get_jwt_identity()
+    job = PredictionJob.query.filter_by(id=job_id, user_id=int(user_id)).first()
+
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string']) # EventSource cannot send headers, so allow ?jwt=
+def stream_job(job_id):
+    user_id = get_jwt_identity()
+    if not PredictionJob.query.filter_by(id=job_id, user_id=int(user_id)).first():
+        return jsonify({"message": "Job not found"}), 404
+
+    if not job_streams.acquire(blocking=False):
+        response = jsonify({"message": "Too many open job streams, poll the job instead", "status_url": f"/api/jobs/{job_id}"})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+
+    poll = app.config['JOB_STREAM_POLL_SECONDS']
+    deadline = time.monotonic() + app.config['JOB_STREAM_TIMEOUT_SECONDS']
+
+    @stream_with_context
+    def events():
+        last_status = None
+        while True:
+            db.session.expire_all()
+            job = db.session.get(PredictionJob, job_id)
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            if job.status in ('done', 'failed'):
+                return
+            if time.monotonic() > deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            # Release the connection while sleeping
+            db.session.rollback()
+            time.sleep(poll)
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs once the stream is closed, whether or not the client read it all
+    response.call_on_close(job_streams.release)
+    return response
+
+HISTORY_COLUMNS = (
+    Prediction.id,
+    Prediction.user_id,
+    Prediction.image_path,
+    Prediction.prediction,
+    Prediction.confidence,
+    Prediction.model_version,
+    Prediction.created_at,
+)
+
+def encode_cursor(created_at, id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode()
+
+def decode_cursor(cursor):
+    created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(id)
+
 @app.route('/api/history', methods=['GET'])
 @jwt_required()
 def history():
+    """Newest-first history, one page at a time.
+
+    Query params: limit, cursor (next_cursor from the previous page),
+    prediction (exact class), since / until (ISO dates or datetimes).
+    """
     user_id = get_jwt_identity()
-    predictions = Prediction.query.filter_by(user_id=int(user_id))\
-        .order_by(Prediction.created_at.desc())\
-        .all()
-    
-    return jsonify([p.to_dict() for p in predictions]), 200
+
+    try:
+        limit = min(max(int(request.args.get('limit', app.config['HISTORY_PAGE_SIZE'])), 1), app.config['HISTORY_MAX_PAGE_SIZE'])
+        cursor = request.args.get('cursor')
+        cursor = decode_cursor(cursor) if cursor else None
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        until = request.args.get('until')
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({"message": "Invalid limit, cursor or date"}), 400
+
+    # Only the columns the page needs, as plain rows rather than ORM objects
+    query = db.select(*HISTORY_COLUMNS).where(Prediction.user_id == int(user_id))
+
+    if request.args.get('prediction'):
+        query = query.where(Prediction.prediction == request.args['prediction'])
+    if since:
+        query = query.where(Prediction.created_at >= since)
+    if until:
+        query = query.where(Prediction.created_at < until)
+    if cursor:
+        created_at, id = cursor
+        query = query.where(db.or_(
+            Prediction.created_at < created_at,
+            db.and_(Prediction.created_at == created_at, Prediction.id < id)
+        ))
+
+    rows = db.session.execute(
+        query.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = [{
+        **row._asdict(),
+        "created_at": row.created_at.isoformat(),
+        # Small derivatives for list views; /uploads/<image_path> stays the original
+        "thumbnail_url": f"/uploads/thumb/{row.image_path}",
+        "medium_url": f"/uploads/medium/{row.image_path}",
+    } for row in rows]
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
+
+@app.route('/api/stats', methods=['GET'])
+@jwt_required()
+def prediction_stats():
+    """Counts and mean confidence for the user's predictions, overall, per class and per day.
+
+    Query params: since / until (inclusive ISO dates, UTC), prediction (exact class).
+    Served from the prediction_stats rollup rather than by scanning history.
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        since = request.args.get('since')
+        since = date.fromisoformat(since) if since else None
+        until = request.args.get('until')
+        until = date.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({"message": "Invalid date, expected YYYY-MM-DD"}), 400
+
+    return jsonify(stats.summarize(
+        db.session, int(user_id), since=since, until=until, prediction=request.args.get('prediction')
+    )), 200
 
 # ==============================
 # UTILITY ROUTES
 # ==============================
 
+def send_upload(directory, filename, etag, mimetype=None):
+    """Serve an upload as immutable: names are content hashes, so the bytes never change.
+
+    The ETag is derived from the name rather than the file's mtime, so it is
+    the same on every worker and host; conditional GETs get a 304.
+    """
+    response = send_from_directory(
+        directory, filename,
+        mimetype=mimetype,
+        etag=etag,
+        max_age=app.config['UPLOAD_CACHE_MAX_AGE'],
+        conditional=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def release_upload(unique_filename):
+    """Delete an upload and its thumbnails unless a prediction, a pending job or the grace period still keeps it."""
+    with app.app_context():
+        reclaimer.release(unique_filename)
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    path = storage.path(secure_filename(filename))
+    return send_upload(os.path.dirname(path), os.path.basename(path), etag=os.path.basename(path))
+
+@app.route('/uploads/<size>/<filename>')
+def uploaded_derivative(size, filename):
+    """Thumbnail / medium WebP of an upload (sizes in thumbnails.SIZES)."""
+    if size not in thumbnails.SIZES:
+        abort(404)
+    filename = secure_filename(filename)
+    name = thumbnails.derivative_name(filename, size)
+    if not storage.exists(name):
+        # Uploads from before thumbnails existed, or not written yet: build them now
+        if not storage.exists(filename):
+            abort(404)
+        generate_thumbnails(filename)
+    path = storage.path(name)
+    return send_upload(os.path.dirname(path), name, etag=name, mimetype=thumbnails.MIMETYPE)
 
 @app.route('/api/history/<int:id>', methods=['DELETE'])
 @jwt_required()
@@ -150,13 +675,76 @@ def delete_history_item(id):
     if not prediction:
         return jsonify({"message": "Prediction not found"}), 404
         
-    db.session.delete(prediction)
+    image_path = prediction.image_path
+    # Only the request whose DELETE removed the row takes it out of the stats
+    deleted = db.session.execute(db.delete(Prediction).where(Prediction.id == prediction.id)).rowcount
+    if deleted:
+        stats.record_deleted(db.session, [prediction])
     db.session.commit()
+
+    # Uploads are shared by content hash: other rows, queued jobs or a fresh
+    # upload of the same bytes may still need the file
+    upload_pool.submit(release_upload, image_path)
     return jsonify({"message": "Deleted successfully"}), 200
 
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests, model or not."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    body = {
+        "status": predictor.status,
+        "engine": predictor.engine,
+        "model_version": predictor.model_version,
+    }
+    if predictor.is_ready:
+        body["load_seconds"] = round(predictor.load_seconds, 3)
+        return jsonify(body), 200
+    if predictor.status == 'failed':
+        body["error"] = predictor.error
+    return jsonify(body), 503
+
 @app.route('/')
 def home():
     return jsonify({"message": "Plant Disease API is running"}), 200
 
+# ==============================
+# CLI COMMANDS
+# ==============================
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables, columns and indexes. Run once per deploy, before the workers start."""
+    upgrade_schema()
+    print("✅ Database schema is up to date")
+
+@app.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Rebuild the prediction_stats rollup from all predictions. Run with writes paused."""
+    rows = stats.backfill(db.session)
+    print(f"📊 Rebuilt prediction stats: {rows} user/day/class rows")
+
+@app.cli.command('reclaim-uploads')
+@click.option('--dry-run', is_flag=True, help="Only report what would be deleted.")
+def reclaim_uploads_command(dry_run):
+    """Delete upload files no prediction refers to (and past UPLOAD_RETENTION_DAYS)."""
+    result = reclaimer.run_once(dry_run=dry_run)
+    verb = "Would delete" if dry_run else "Deleted"
+    print(f"🧹 Scanned {result['scanned']} files, moved {result['migrated']} into shards, failed {result['stale_jobs']} stale jobs. "
+          f"{verb} {result['orphan']} orphaned and {result['retention']} expired files ({result['bytes'] / 1e6:.1f} MB)")
+
 if __name__ == '__main__':
+    # Development server: no separate deploy step, so bring the schema up to date here
+    with app.app_context():
+        upgrade_schema()
+    # The debug reloader runs this twice; only its serving child loads the model
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_worker()
     app.run(debug=True, port=5000)
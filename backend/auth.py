@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import registry
+
+HASH_SECONDS = registry.histogram(
+    "auth_hash_seconds",
+    "Time spent in bcrypt, by operation (hash, verify)",
+    labelnames=("operation",),
+)
+HASH_QUEUE_WAIT = registry.histogram(
+    "auth_hash_queue_wait_seconds",
+    "Time a password hash or check waited for a free hashing thread",
+)
+AUTH_ATTEMPTS = registry.counter(
+    "auth_attempts_total",
+    "Register and login attempts by outcome",
+    labelnames=("endpoint", "outcome"),
+)
+USER_CACHE_HITS = registry.counter("auth_user_cache_hits_total", "Login lookups served from the user cache")
+USER_CACHE_MISSES = registry.counter("auth_user_cache_misses_total", "Login lookups that had to query the database")
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class CachedUser:
+    """The columns login needs, detached from any session so it can be cached."""
+
+    __slots__ = ("id", "name", "email", "password_hash", "created_at")
+
+    def __init__(self, id, name, email, password_hash, created_at):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.password_hash = password_hash
+        self.created_at = created_at
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.name, user.email, user.password_hash, user.created_at)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small, bounded thread pool instead of the request thread.
+
+    bcrypt is deliberately slow and CPU-bound (it releases the GIL), so a
+    burst of logins would otherwise occupy every request thread and core.
+    At most ``max_workers`` hashes run at once per process; requests beyond
+    ``max_pending`` queued or running raise ``HasherBusy`` so the caller can
+    shed load instead of piling up.
+    """
+
+    def __init__(self, bcrypt, log_rounds=12, max_workers=2, max_pending=16):
+        self.bcrypt = bcrypt
+        self.log_rounds = int(log_rounds)
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+
+    def hash(self, password):
+        return self._run(self._hash_task(password))
+
+    def check(self, password_hash, password):
+        return self._run(self._timed("verify", lambda: self.bcrypt.check_password_hash(password_hash, password)))
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with a different cost than ``log_rounds``."""
+        try:
+            # $2b$<rounds>$<salt+hash>
+            return int(password_hash.split('$')[2]) != self.log_rounds
+        except (IndexError, ValueError):
+            return True
+
+    def rehash_later(self, password, save):
+        """Hash ``password`` at the current cost on the pool and pass it to ``save``, without waiting."""
+        task = self._hash_task(password)
+        self._reserve()
+
+        def run():
+            try:
+                save(task())
+            finally:
+                self._release()
+
+        try:
+            self._get_executor().submit(run)
+        except Exception:
+            self._release()
+            raise
+
+    def _hash_task(self, password):
+        return self._timed("hash", lambda: self.bcrypt.generate_password_hash(password, self.log_rounds).decode('utf-8'))
+
+    @staticmethod
+    def _timed(operation, fn):
+        enqueued_at = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            HASH_QUEUE_WAIT.observe(started - enqueued_at)
+            try:
+                return fn()
+            finally:
+                HASH_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        return task
+
+    def _run(self, task):
+        self._reserve()
+        try:
+            return self._get_executor().submit(task).result()
+        finally:
+            self._release()
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy()
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _get_executor(self):
+        # Like the job queue, pool threads must be created after fork.
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+                self._pid = pid
+            return self._executor
@@ -0,0 +1,117 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import registry
+
+BATCH_SIZE = registry.histogram(
+    "predict_batch_size",
+    "Number of images per forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QUEUE_WAIT = registry.histogram(
+    "predict_queue_wait_seconds",
+    "Time an image spent queued before its batch ran",
+)
+
+
+class _Request:
+    __slots__ = ("image", "future", "enqueued_at")
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """Collects concurrent predict calls into a single batched forward pass.
+
+    Callers decode their own image (so decoding stays parallel across request
+    threads) and then block on a future while a background thread groups up to
+    ``max_batch_size`` images, waiting at most ``max_wait_ms`` after the first
+    one arrives before running the batch.
+    """
+
+    def __init__(self, predictor, max_batch_size=8, max_wait_ms=5.0):
+        self.predictor = predictor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def predict(self, source):
+        """Drop-in replacement for ``PlantDiseasePredictor.predict``."""
+        if not self.predictor.is_ready:
+            return {"error": "Model not loaded"}, 500
+
+        try:
+            image_array = self.predictor.preprocess(source)
+        except Exception as e:
+            return {"error": str(e)}, 500
+
+        return self.submit(image_array).result()
+
+    def submit(self, image_array):
+        """Queue a preprocessed image array; returns a Future resolving to its result."""
+        req = _Request(image_array)
+
+        if self.max_batch_size == 1:
+            self._run_batch([req])
+            return req.future
+
+        self._ensure_worker()
+        self._queue.put(req)
+        return req.future
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a scheduler created in the gunicorn
+        # master starts its worker lazily inside each child process.
+        pid = os.getpid()
+        if self._worker is not None and self._pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == pid and self._worker.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._worker = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+            self._worker.start()
+
+    def _loop(self):
+        q = self._queue
+        while True:
+            first = q.get()
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(q.get(timeout=remaining))
+                    else:
+                        batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for req in batch:
+            QUEUE_WAIT.observe(started - req.enqueued_at)
+        BATCH_SIZE.observe(len(batch))
+
+        try:
+            results = self.predictor.predict_batch([req.image for req in batch])
+        except Exception as e:
+            results = [({"error": str(e)}, 500)] * len(batch)
+
+        for req, result in zip(batch, results):
+            req.future.set_result(result)
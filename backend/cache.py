@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import registry
+
+CACHE_HITS = registry.counter("prediction_cache_hits_total", "Predictions served from the content-hash cache")
+CACHE_MISSES = registry.counter("prediction_cache_misses_total", "Predictions that had to run the model")
+
+
+def content_digest(data):
+    """Hash of an image's bytes: the cache key, and the name its upload is stored under."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """LRU of prediction results keyed on the uploaded image's content hash.
+
+    The key also includes the model version and rejection threshold, so a
+    retrained model or a changed threshold never serves stale results.
+    """
+
+    def __init__(self, predictor, maxsize=1024):
+        self.predictor = predictor
+        self.maxsize = int(maxsize)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, digest):
+        return (digest, self.predictor.model_version, self.predictor.threshold)
+
+    def get(self, digest):
+        if self.maxsize <= 0:
+            return None
+        key = self._key(digest)
+        with self._lock:
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+        if result is None:
+            CACHE_MISSES.inc()
+        else:
+            CACHE_HITS.inc()
+        return result
+
+    def put(self, digest, result):
+        if self.maxsize <= 0:
+            return
+        key = self._key(digest)
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def predict(self, digest, source, scheduler):
+        """The cached result for ``digest``, else ``scheduler.predict(source)``.
+
+        ``source`` is an image path, bytes or buffer. Errors (``(error,
+        status)`` tuples) are returned but never cached.
+        """
+        result = self.get(digest)
+        if result is None:
+            result = scheduler.predict(source)
+            if not isinstance(result, tuple):
+                self.put(digest, result)
+        return result
+
+
+class TTLCache:
+    """Small LRU whose entries expire ``ttl`` seconds after they were stored.
+
+    Per process, so another worker's writes only show up once an entry
+    expires; callers must ``pop`` keys they change themselves.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
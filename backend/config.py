@@ -9,11 +9,78 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = database_url or 'sqlite:///plant_disease.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Database Engine Config
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # One file, no server: pooling knobs do not apply; pragmas are set per
+        # connection in database.py
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    else:
+        # Per worker process. Size it for the request threads plus the job,
+        # upload and reclaim threads that also talk to the database.
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),  # seconds to wait for a free connection
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # reconnect before server/proxy idle timeouts
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',  # drop dead connections before use
+        }
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')  # DELETE is SQLite's default (writers block readers)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))  # wait for the write lock instead of failing
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # safe with WAL; FULL fsyncs every commit
     
+    # Logging Config
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # DEBUG adds per-prediction top-5 logs
+
+    # Model Loading Config
+    # background: load + warm up on a thread at startup (per gunicorn worker)
+    # lazy: load on the first request that needs the model
+    # sync: load before the app (or each gunicorn worker) serves anything
+    MODEL_LOAD = os.environ.get('MODEL_LOAD', 'background')
+    MODEL_WAIT_SECONDS = float(os.environ.get('MODEL_WAIT_SECONDS', 10))  # then 503 with Retry-After
+
     # JWT Config
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt_secret_key_change_in_prod'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24) # Long expiry for demo convenience
     
+    # Auth Config
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))  # stored hashes are upgraded on the next login after a change
+    AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', 2))  # concurrent bcrypt operations per process
+    AUTH_HASH_MAX_PENDING = int(os.environ.get('AUTH_HASH_MAX_PENDING', 16))  # beyond this register/login return 503
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))  # 0 disables
+
     # Upload Config
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    PERSIST_UPLOADS = os.environ.get('PERSIST_UPLOADS', '1') == '1'  # 0 keeps only the DB row, not the image
+    BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 64))
+    BATCH_MAX_CONTENT_LENGTH = 256 * 1024 * 1024  # 256MB max for /api/predict/batch
+    DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', 4))
+    # Upload lifecycle: a background pass deletes files no prediction refers to
+    # (flask --app backend.app reclaim-uploads runs one by hand)
+    UPLOAD_RECLAIM_INTERVAL_SECONDS = float(os.environ.get('UPLOAD_RECLAIM_INTERVAL_SECONDS', 0))  # 0 disables the background pass
+    UPLOAD_ORPHAN_GRACE_SECONDS = float(os.environ.get('UPLOAD_ORPHAN_GRACE_SECONDS', 3600))  # never touch files younger than this
+    UPLOAD_RETENTION_DAYS = float(os.environ.get('UPLOAD_RETENTION_DAYS', 0))  # >0: also delete images of older predictions (rows stay)
+    UPLOAD_CACHE_MAX_AGE = int(os.environ.get('UPLOAD_CACHE_MAX_AGE', 365 * 24 * 3600))  # uploads are content-addressed, so cache for a year
+
+    # History Pagination Config
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_MAX_PAGE_SIZE = 200
+
+    # Inference Batching Config
+    PREDICT_MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 8))  # 1 disables batching
+    PREDICT_MAX_WAIT_MS = float(os.environ.get('PREDICT_MAX_WAIT_MS', 5))
+
+    # Prediction Cache Config
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))  # entries per process; 0 disables
+
+    # Async Prediction Jobs Config
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 32))  # per process; beyond this /api/predict?async=1 returns 503
+    JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', 600))  # unfinished jobs idle this long are failed (their worker restarted); 0 disables
+    JOB_STREAM_POLL_SECONDS = float(os.environ.get('JOB_STREAM_POLL_SECONDS', 0.5))
+    # Each open stream holds a request thread, so keep streams short and few;
+    # clients past the cap (503) or the timeout fall back to polling /api/jobs/<id>
+    JOB_STREAM_TIMEOUT_SECONDS = float(os.environ.get('JOB_STREAM_TIMEOUT_SECONDS', 15))
+    JOB_STREAM_MAX_PER_WORKER = int(os.environ.get('JOB_STREAM_MAX_PER_WORKER', 2))
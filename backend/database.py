@@ -0,0 +1,27 @@
+from sqlalchemy import event
+
+
+def configure_engine(engine, config):
+    """Per-connection settings that cannot be expressed as engine options.
+
+    SQLite gets WAL journaling (readers no longer block the writer and vice
+    versa), a busy timeout so concurrent writers wait instead of failing with
+    "database is locked", and ``synchronous=NORMAL``, which is safe with WAL
+    and avoids an fsync per commit. Pool settings for other databases come
+    from ``SQLALCHEMY_ENGINE_OPTIONS``.
+    """
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return
+
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
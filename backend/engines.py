@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import torch
+from torchvision import models
+from torchvision.models import quantization as quantized_models
+
+from .model_spec import INPUT_SIZE
+from .onnx_engine import ONNX_PATH
+from .precision import Precision
+
+# eager: plain float32 nn.Module (the default)
+# fused: TorchScript graph, frozen with conv-bn folding and conv-relu fusion
+# int8:  post-training static quantization, calibrated on validation images
+# onnx:  exported graph run by ONNX Runtime (no torch import at serve time)
+ENGINES = ("eager", "fused", "int8", "onnx")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+MODEL_DIR = os.path.join(PROJECT_ROOT, "model")
+ARTIFACT_PATHS = {
+    "fused": os.path.join(MODEL_DIR, "plant_disease_model.fused.pt"),
+    "int8": os.path.join(MODEL_DIR, "plant_disease_model.int8.pt"),
+    "onnx": ONNX_PATH,
+}
+
+INPUT_SHAPE = (1, 3, INPUT_SIZE[1], INPUT_SIZE[0])
+
+
+def build_model(num_classes, quantizable=False, pretrained=False):
+    """MobileNetV2 with the classifier resized to ``num_classes``.
+
+    ``pretrained`` starts from the ImageNet weights (training); otherwise the
+    network is left uninitialized for a state dict to be loaded into.
+    """
+    weights = models.MobileNet_V2_Weights.IMAGENET1K_V1 if pretrained else None
+    if quantizable:
+        model = quantized_models.mobilenet_v2(weights=weights, quantize=False)
+    else:
+        model = models.mobilenet_v2(weights=weights)
+    model.classifier[1] = torch.nn.Linear(model.last_channel, num_classes)
+    return model
+
+
+def quantized_backend():
+    supported = torch.backends.quantized.supported_engines
+    for name in ("x86", "fbgemm", "qnnpack"):
+        if name in supported:
+            return name
+    return None
+
+
+def build_fused(state_dict, num_classes):
+    model = build_model(num_classes)
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    # Freezing inlines the weights and folds BatchNorm into the convolutions.
+    # The conv + relu fusion from optimize_for_inference cannot be serialized,
+    # so load_engine applies it after loading.
+    return torch.jit.freeze(torch.jit.script(model))
+
+
+def build_int8(state_dict, num_classes, calibration_batches):
+    """Quantize to int8 with observers calibrated on ``calibration_batches`` (iterable of input tensors)."""
+    backend = quantized_backend()
+    if backend is None:
+        raise RuntimeError("This torch build has no quantized CPU backend")
+    torch.backends.quantized.engine = backend
+
+    model = build_model(num_classes, quantizable=True)
+    model.load_state_dict(state_dict)
+    model.eval()
+    model.fuse_model(is_qat=False)
+    model.qconfig = torch.ao.quantization.get_default_qconfig(backend)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    with torch.no_grad():
+        for inputs in calibration_batches:
+            model(inputs)
+
+    torch.ao.quantization.convert(model, inplace=True)
+    return torch.jit.freeze(torch.jit.script(model))
+
+
+def export_onnx(state_dict, num_classes, path=ONNX_PATH):
+    """Export to ONNX with a dynamic batch axis."""
+    model = build_model(num_classes)
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    example = torch.randn(2, *INPUT_SHAPE[1:])
+    torch.onnx.export(
+        model,
+        (example,),
+        path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=18,
+        external_data=False,
+    )
+    return model
+
+
+class TorchRunner:
+    """Adapts a torch module to the numpy-in, numpy-out interface of OnnxRunner."""
+
+    def __init__(self, module, precision=None):
+        self.precision = precision or Precision()
+        self.module = self.precision.prepare_model(module)
+        self.device = torch.device("cpu")
+
+    def __call__(self, batch):
+        inputs = self.precision.prepare_input(torch.from_numpy(batch))
+        with torch.inference_mode(), self.precision.autocast(self.device):
+            return self.module(inputs).float().numpy()
+
+
+def max_abs_diff(reference, runner, batch_sizes=(1, 4), seed=0):
+    """Largest logit difference between a torch module and a runner on random inputs."""
+    generator = torch.Generator().manual_seed(seed)
+    worst = 0.0
+    for batch_size in batch_sizes:
+        inputs = torch.randn(batch_size, *INPUT_SHAPE[1:], generator=generator)
+        with torch.inference_mode():
+            expected = reference(inputs).numpy()
+        worst = max(worst, float(np.abs(runner(inputs.numpy()) - expected).max()))
+    return worst
+
+
+def load_engine(name, map_location="cpu", path=None):
+    """Load a prebuilt TorchScript artifact for ``name`` (``fused`` or ``int8``)."""
+    if name not in ("fused", "int8"):
+        raise ValueError(f"'{name}' is not a TorchScript engine, expected 'fused' or 'int8'")
+
+    path = path or ARTIFACT_PATHS[name]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run build_engines.py first")
+
+    if name == "int8":
+        torch.backends.quantized.engine = quantized_backend()
+    model = torch.jit.load(path, map_location=map_location)
+    model.eval()
+    if name == "fused":
+        model = torch.jit.optimize_for_inference(model)
+    return model
@@ -0,0 +1,47 @@
+import numpy as np
+from PIL import Image, ImageOps
+
+from . import model_spec
+
+IMG_SIZE = model_spec.INPUT_SIZE
+MEAN = np.array(model_spec.MEAN, dtype=np.float32)
+STD = np.array(model_spec.STD, dtype=np.float32)
+
+# ToTensor's /255 and Normalize folded into a single multiply-add
+_SCALE = 1.0 / (255.0 * STD)
+_BIAS = -MEAN / STD
+
+
+def load_image(source, size=IMG_SIZE):
+    """Open an image and return it as an upright RGB PIL image of ``size``.
+
+    For JPEGs, ``draft`` lets libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT
+    scaling) while staying at least as large as the target, so a 12MP phone
+    photo is never fully decoded only to be thrown away by the resize.
+    """
+    image = Image.open(source)
+
+    if image.format == "JPEG":
+        # Square request so the bound holds whichever way EXIF rotates it
+        side = max(size)
+        image.draft("RGB", (side, side))
+
+    # Handle EXIF Orientation
+    try:
+        image = ImageOps.exif_transpose(image)
+    except Exception:
+        pass # safely ignore if no exif
+
+    image = image.convert("RGB")
+    return image.resize(size, Image.BILINEAR)
+
+
+def to_array(image):
+    """Normalized float32 CHW array from an RGB PIL image, in one vectorized step."""
+    arr = np.asarray(image, dtype=np.float32) * _SCALE + _BIAS
+    return np.ascontiguousarray(arr.transpose(2, 0, 1))
+
+
+def preprocess(source, size=IMG_SIZE):
+    """Path, bytes buffer or file-like -> normalized float32 array of shape (3, H, W)."""
+    return to_array(load_image(source, size))
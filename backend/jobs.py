@@ -0,0 +1,136 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .models import db, Prediction, PredictionJob
+from .metrics import registry
+from . import stats
+
+DB_COMMIT_SECONDS = registry.histogram(
+    "predict_db_commit_seconds",
+    "Time to insert and commit prediction rows, by source",
+    labelnames=("source",),
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def fail_stale_jobs(older_than_seconds):
+    """Mark queued/running jobs untouched for ``older_than_seconds`` as failed; returns how many.
+
+    Jobs run on the submitting worker's thread pool, so a worker that
+    restarts (deploy, max_requests, OOM) leaves its unfinished rows behind.
+    Without this, clients would poll them forever and the upload reclaimer
+    would keep their files.
+    """
+    if older_than_seconds <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    failed = db.session.execute(
+        db.update(PredictionJob)
+        .where(PredictionJob.status.in_(('queued', 'running')), PredictionJob.updated_at < cutoff)
+        .values(status='failed', result={"error": "Job was interrupted, please upload the image again"}, updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return failed
+
+
+class JobQueue:
+    """Runs predictions off the request thread on a local thread pool.
+
+    ``predict`` is called with the saved upload's filename and returns the
+    same result (or ``(error, status)`` tuple) as ``predictor.predict``.
+
+    Job state lives in the ``prediction_jobs`` table rather than in memory, so
+    any gunicorn worker can answer a poll for a job queued by another one.
+    At most ``max_pending`` jobs may be queued or running per process;
+    beyond that ``submit`` raises ``QueueFull`` so the caller can shed load.
+    """
+
+    def __init__(self, app, predict, max_workers=2, max_pending=32):
+        self.app = app
+        self.predict = predict
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+
+    def submit(self, user_id, image_path):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull()
+            self._pending += 1
+
+        try:
+            job = PredictionJob(id=uuid.uuid4().hex, user_id=user_id, image_path=image_path)
+            db.session.add(job)
+            db.session.commit()
+            self._get_executor().submit(self._run, job.id)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        return job
+
+    def _get_executor(self):
+        # Like the batch scheduler, pool threads must be created after fork.
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="predict-job")
+                self._pid = pid
+            return self._executor
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                self._process(job_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _process(self, job_id):
+        job = db.session.get(PredictionJob, job_id)
+        if job is None or job.status != 'queued': # e.g. already failed as stale
+            return
+
+        job.status = 'running'
+        db.session.commit()
+
+        try:
+            result = self.predict(job.image_path)
+
+            if isinstance(result, tuple): # Error case
+                job.status = 'failed'
+                job.result = result[0]
+                db.session.commit()
+            else:
+                with DB_COMMIT_SECONDS.time(source="job"):
+                    prediction = Prediction(
+                        user_id=job.user_id,
+                        image_path=job.image_path,
+                        prediction=result['prediction'],
+                        confidence=result['confidence'],
+                        model_version=result.get('model_version'),
+                        created_at=datetime.utcnow()
+                    )
+                    db.session.add(prediction)
+                    stats.record_inserted(db.session, [prediction])
+                    db.session.flush()
+                    job.prediction_id = prediction.id
+                    job.status = 'done'
+                    job.result = result
+                    db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(PredictionJob, job_id)
+            job.status = 'failed'
+            job.result = {"error": str(e)}
+            db.session.commit()
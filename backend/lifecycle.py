@@ -0,0 +1,187 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .models import db, Prediction, PredictionJob
+from .metrics import registry
+from .jobs import fail_stale_jobs
+from . import thumbnails
+
+RECLAIMED_FILES = registry.counter(
+    "upload_reclaimed_files_total",
+    "Upload files deleted, by reason (orphan: no prediction refers to it; retention: only older ones do)",
+    labelnames=("reason",),
+)
+RECLAIMED_BYTES = registry.counter("upload_reclaimed_bytes_total", "Bytes freed by deleting upload files")
+RECLAIM_SECONDS = registry.histogram(
+    "upload_reclaim_seconds",
+    "Time for one full reclaim pass over upload storage",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+
+# Originals referenced per query; keeps IN (...) well below driver parameter limits
+QUERY_BATCH = 500
+
+
+def owner_of(name):
+    """The original an upload file belongs to: ``<digest>.thumb.webp`` -> ``<digest>``."""
+    return name.split('.', 1)[0]
+
+
+def is_derivative(name):
+    parts = name.split('.')
+    return len(parts) == 3 and parts[1] in thumbnails.SIZES and parts[2] == thumbnails.EXTENSION
+
+
+class UploadReclaimer:
+    """Deletes upload files that no prediction needs any more.
+
+    A file is kept while a ``Prediction`` (or a queued/running
+    ``PredictionJob``) refers to its original. With ``retention_days`` set,
+    only predictions from that window count, so images of older history
+    rows are removed while the rows stay. Files younger than
+    ``grace_seconds`` are never touched: an upload is written before its
+    row is committed. Each pass first moves pre-sharding flat files into
+    their shard, next to their derivatives.
+
+    ``start()`` runs a pass every ``interval_seconds`` on a daemon thread.
+    Each gunicorn worker starts one, but the storage's ``lock`` lets only one
+    of them scan at a time.
+    """
+
+    def __init__(self, app, storage, interval_seconds=3600, grace_seconds=3600, retention_days=0, stale_job_seconds=0):
+        self.app = app
+        self.storage = storage
+        self.interval_seconds = float(interval_seconds)
+        self.grace_seconds = float(grace_seconds)
+        self.retention_days = float(retention_days)
+        self.stale_job_seconds = float(stale_job_seconds)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Start the periodic reclaim thread, once per process (no-op if the interval is 0)."""
+        if self.interval_seconds <= 0:
+            return
+        # Like the job queue, the thread must be created after fork
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            self._thread = threading.Thread(target=self._loop, name="upload-reclaimer", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            # Jitter so workers started together do not all wake at once
+            time.sleep(self.interval_seconds * random.uniform(0.9, 1.1))
+            try:
+                with self.app.app_context():
+                    self.run_once(skip_if_locked=True)
+            except Exception:
+                self.app.logger.exception("Upload reclaim pass failed")
+
+    def run_once(self, dry_run=False, skip_if_locked=False):
+        """One pass over storage; returns counts of scanned, migrated and deleted files and freed bytes."""
+        lock = self.storage.lock("reclaim", blocking=not skip_if_locked)
+        if lock is False:
+            return None
+        try:
+            with RECLAIM_SECONDS.time():
+                return self._reclaim(dry_run)
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def release(self, name):
+        """Delete one upload and its derivatives now, if nothing needs it any more.
+
+        Uses the same rules as a pass: the files stay while a prediction or an
+        unfinished job refers to the original, or while it is inside the
+        grace period (a request may have just uploaded the same bytes).
+        Returns the number of bytes freed.
+        """
+        if self._referenced([name]):
+            return 0
+        mtime = self.storage.mtime(name)
+        if mtime is not None and mtime >= time.time() - self.grace_seconds:
+            return 0
+        freed = 0
+        for file in [name] + [thumbnails.derivative_name(name, size) for size in thumbnails.SIZES]:
+            size = self.storage.delete(file)
+            if size:
+                RECLAIMED_FILES.inc(reason="orphan")
+                RECLAIMED_BYTES.inc(size)
+            freed += size
+        return freed
+
+    def _reclaim(self, dry_run):
+        stats = {"scanned": 0, "orphan": 0, "retention": 0, "bytes": 0, "migrated": 0, "stale_jobs": 0}
+        if not dry_run:
+            # Jobs orphaned by a worker restart would otherwise keep their files forever
+            stats["stale_jobs"] = fail_stale_jobs(self.stale_job_seconds)
+            # Dry runs leave pre-sharding files in place; scan() still groups
+            # them with their derivatives
+            stats["migrated"] = self.storage.migrate_legacy()
+        pending = []
+        for group in self.storage.scan():
+            pending.extend(group)
+            # Groups keep an original and its derivatives together, so a
+            # batch boundary never separates them
+            if len(pending) >= QUERY_BATCH:
+                self._reclaim_batch(pending, stats, dry_run)
+                pending = []
+        if pending:
+            self._reclaim_batch(pending, stats, dry_run)
+        return stats
+
+    def _reclaim_batch(self, files, stats, dry_run):
+        stats["scanned"] += len(files)
+        cutoff = time.time() - self.grace_seconds
+        candidates = [(name, size) for name, size, mtime in files if mtime < cutoff]
+        if not candidates:
+            return
+
+        originals = [name for name, _, _ in files if not is_derivative(name)]
+        live = self._referenced(originals)
+        current = self._referenced(originals, since=self._retention_cutoff()) if self.retention_days > 0 else live
+
+        # Anything of an upload still in its grace period stays, derivatives included
+        keep_owners = {owner_of(name) for name in current}
+        keep_owners |= {owner_of(name) for name, _, mtime in files if mtime >= cutoff}
+        live_owners = {owner_of(name) for name in live}
+
+        for name, size in candidates:
+            owner = owner_of(name)
+            if owner in keep_owners:
+                continue
+            reason = "retention" if owner in live_owners else "orphan"
+            if not dry_run:
+                size = self.storage.delete(name)
+                RECLAIMED_FILES.inc(reason=reason)
+                RECLAIMED_BYTES.inc(size)
+            stats[reason] += 1
+            stats["bytes"] += size
+
+    def _retention_cutoff(self):
+        return datetime.utcnow() - timedelta(days=self.retention_days)
+
+    @staticmethod
+    def _referenced(names, since=None):
+        """The subset of ``names`` that a prediction (created after ``since``) or an unfinished job uses."""
+        referenced = set()
+        for start in range(0, len(names), QUERY_BATCH):
+            chunk = names[start:start + QUERY_BATCH]
+            query = db.select(Prediction.image_path).where(Prediction.image_path.in_(chunk))
+            if since is not None:
+                query = query.where(Prediction.created_at >= since)
+            jobs = db.select(PredictionJob.image_path).where(
+                PredictionJob.image_path.in_(chunk),
+                PredictionJob.status.in_(('queued', 'running')),
+            )
+            referenced.update(db.session.scalars(query.union(jobs)))
+        return referenced
@@ -0,0 +1,156 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """Shared label handling: one child series per distinct label-value tuple."""
+
+    type = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _header(self):
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram exposed in Prometheus text format."""
+
+    type = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        idx = bisect_left(self.buckets, value)
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [bucket counts (last slot is +Inf), sum, count]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the ``with`` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._series.get(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            counts = list(counts)
+        cumulative, running = [], 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            running += c
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+    def render(self):
+        with self._lock:
+            keys = sorted(self._series)
+        if not keys and not self.labelnames:
+            keys = [()]
+
+        lines = self._header()
+        for key in keys:
+            snap = self.snapshot(**dict(zip(self.labelnames, key)))
+            for bound, c in snap["buckets"]:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {c}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {snap['sum']}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {snap['count']}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic counter exposed in Prometheus text format."""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    @property
+    def value(self):
+        """Total across all label values."""
+        with self._lock:
+            return sum(self._series.values())
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        if not series and not self.labelnames:
+            series = [((), 0)]
+
+        lines = self._header()
+        lines.extend(f"{self.name}{self._format_labels(key)} {value}" for key, value in series)
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS, labelnames=()):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets, labelnames)
+            return self._metrics[name]
+
+    def counter(self, name, description, labelnames=()):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description, labelnames)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# Global registry
+registry = Registry()
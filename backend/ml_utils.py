@@ -1,9 +1,15 @@
-import torch
 import numpy as np
-from torchvision import models, transforms
-from PIL import Image, ImageOps
-import torch.nn.functional as F
 import os
+import io
+import logging
+import threading
+import time
+
+from . import image_pipeline, model_registry, model_spec, onnx_engine
+from .metrics import registry
+
+# torch is imported only when a torch engine is loaded, so the ONNX Runtime
+# path keeps it out of the API process entirely.
 
 # Paths relative to backend directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,103 +17,382 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR)
 MODEL_PATH = os.path.join(PROJECT_ROOT, "model", "plant_disease_model.pth")
 CLASS_PATH = os.path.join(PROJECT_ROOT, "model", "class_indices.npy")
 
+# Memory-map the weights file instead of copying it into each process. Pages
+# come from the OS page cache, so every gunicorn worker shares one copy.
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "1") == "1"
+
+# Which inference engine to serve: eager | fused | int8 | onnx (see engines.py)
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "eager")
+
+# Eager-engine precision/layout: fp32 | channels_last | bf16 | bf16+channels_last
+# (see precision.py); unsupported options fall back to fp32 at load time.
+PRECISION = os.environ.get("PRECISION", "fp32")
+
+# How often each worker checks model/registry/CURRENT for a new version (0 = never)
+REGISTRY_POLL_SECONDS = float(os.environ.get("MODEL_REGISTRY_POLL_SECONDS", 10))
+
+# Predictions below this confidence are rejected as "Unknown / Low Confidence"
+THRESHOLD = 0.50
+
+# Load progress is logged at INFO; per-prediction details (image size,
+# top-5 classes) at DEBUG
+logger = logging.getLogger(__name__)
+
+DECODE_SECONDS = registry.histogram("predict_decode_seconds", "Time to decode and resize one image")
+TRANSFORM_SECONDS = registry.histogram("predict_transform_seconds", "Time to normalize one decoded image into an array")
+FORWARD_SECONDS = registry.histogram("predict_forward_seconds", "Time for one forward pass (any batch size)")
+PREDICTIONS = registry.counter(
+    "predictions_total",
+    "Model outcomes by predicted class (the top class, also for rejections)",
+    labelnames=("outcome", "prediction"),
+)
+MODEL_RELOADS = registry.counter("model_reloads_total", "Model hot-swap attempts", labelnames=("outcome",))
+
+class LoadedModel:
+    """One model version as a unit: runner, classes and version are swapped
+    together, so a request never mixes one version's logits with another's
+    class list."""
+
+    __slots__ = ("runner", "class_names", "version", "engine", "manifest")
+
+    def __init__(self, runner, class_names, version, engine, manifest=None):
+        self.runner = runner
+        self.class_names = class_names
+        self.version = version
+        self.engine = engine
+        self.manifest = manifest
+
+
 class PlantDiseasePredictor:
+    """Loads the model on demand; nothing heavy happens at construction.
+
+    ``load()`` reads the active version (model/registry CURRENT, or the legacy
+    fixed paths when nothing is registered) and runs warm-up forward passes;
+    ``load_in_background()`` does the same on a thread and then keeps polling
+    the registry. ``status`` moves from ``pending`` to ``loading`` to
+    ``ready`` (or ``failed``, with ``error``).
+
+    ``reload()`` builds and warms a new version beside the serving one and
+    then swaps a single reference, so in-flight requests finish on the
+    version they started with.
+    """
+
     def __init__(self):
-        self.device = torch.device("cpu") # Use CPU for inference to be safe/simple
-        self.class_names = None
-        self.model = None
-        self.transform = transforms.Compose([
-            transforms.Resize((160, 160)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406],
-                                 [0.229, 0.224, 0.225])
-        ])
-        self.load_artifacts()
-
-    def load_artifacts(self):
-        try:
-            # Load Class Names
-            if os.path.exists(CLASS_PATH):
-                self.class_names = np.load(CLASS_PATH, allow_pickle=True)
-                print(f"✅ Loaded {len(self.class_names)} classes.")
-                if len(self.class_names) > 0:
-                    print(f"   Sample classes: {self.class_names[:3]}")
+        self.device = "cpu" # Use CPU for inference to be safe/simple
+        self.threshold = THRESHOLD
+        self.warmup_batch_sizes = (1,)
+        self.poll_seconds = REGISTRY_POLL_SECONDS
+        self.status = "pending"
+        self.error = None
+        self.load_seconds = None
+        self._active = None # LoadedModel
+        self._pointer = None # registry version the active model was loaded from
+        self._load_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._loaded = threading.Event() # set once a load attempt has finished
+        self._loader_pid = None
+        self._watch_lock = threading.Lock()
+        self._watcher_pid = None
+
+    # The serving version's parts, for callers that do not need a consistent snapshot
+    @property
+    def model(self):
+        return self._active.runner if self._active else None # callable: float32 NCHW batch -> logits (numpy)
+
+    @property
+    def class_names(self):
+        return self._active.class_names if self._active else None
+
+    @property
+    def model_version(self):
+        return self._active.version if self._active else None
+
+    @property
+    def engine(self):
+        return self._active.engine if self._active else None
+
+    @property
+    def manifest(self):
+        return self._active.manifest if self._active else None
+
+    @property
+    def is_ready(self):
+        return self.status == "ready"
+
+    def load(self, retry=False):
+        """Load the active version and warm up; returns True once the model is ready.
+
+        A failed load is remembered; pass ``retry=True`` to try again.
+        """
+        with self._load_lock:
+            if self.status == "ready" or (self.status == "failed" and not retry):
+                return self.is_ready
+
+            self.status = "loading"
+            started = time.perf_counter()
+            try:
+                self._pointer = model_registry.current_version()
+                self._active = self._build(self._pointer)
+            except Exception as e:
+                logger.exception("❌ Model failed to load")
+                self.error = str(e)
+                self.status = "failed"
             else:
-                print(f"❌ Error: Class file not found at {CLASS_PATH}")
+                self.load_seconds = time.perf_counter() - started
+                self.status = "ready"
+                logger.info("✅ Model ready in %.1fs (%s engine, version %s)", self.load_seconds, self.engine, self.model_version)
+            finally:
+                self._loaded.set()
+            return self.is_ready
+
+    def reload(self, version=None):
+        """Swap to ``version`` (default: the registry's CURRENT) without dropping requests.
+
+        Returns True if the new version is now serving; on failure the old
+        one keeps serving.
+        """
+        with self._swap_lock:
+            version = version or model_registry.current_version()
+            started = time.perf_counter()
+            try:
+                loaded = self._build(version)
+            except Exception:
+                logger.exception("❌ Could not load model version %s, still serving %s", version, self.model_version)
+                MODEL_RELOADS.inc(outcome="failed")
+                return False
+
+            previous, self._active, self._pointer = self.model_version, loaded, version
+            MODEL_RELOADS.inc(outcome="swapped")
+            logger.info("🔁 Swapped model %s -> %s in %.1fs", previous, loaded.version, time.perf_counter() - started)
+            return True
+
+    def load_in_background(self):
+        """Start ``load()`` on a daemon thread, once per process, then poll for new versions."""
+        # Threads do not survive fork, so a predictor created in the gunicorn
+        # master is loaded by a thread started inside each worker.
+        pid = os.getpid()
+        with self._load_lock:
+            if self._loader_pid == pid:
                 return
+            self._loader_pid = pid
+        threading.Thread(target=self._load_and_watch, name="model-loader", daemon=True).start()
 
-            # Load Model
-            if os.path.exists(MODEL_PATH):
-                self.model = models.mobilenet_v2(weights=None)
-                # Adjust classifier to match training
-                self.model.classifier[1] = torch.nn.Linear(self.model.last_channel, len(self.class_names))
-                
-                # Load state dict
-                self.model.load_state_dict(torch.load(MODEL_PATH, map_location=self.device))
-                self.model.to(self.device)
-                self.model.eval()
-                print("✅ Model loaded successfully.")
-            else:
-                print(f"❌ Error: Model file not found at {MODEL_PATH}")
+    def start_watching(self):
+        """Poll the registry for new versions on a daemon thread, once per process.
 
-        except Exception as e:
-            print(f"❌ Exception loading artifacts: {e}")
+        ``load_in_background`` does this itself; call it after a plain ``load()``.
+        """
+        if self.poll_seconds <= 0:
+            return
+        pid = os.getpid()
+        with self._watch_lock:
+            if self._watcher_pid == pid:
+                return
+            self._watcher_pid = pid
+        threading.Thread(target=self._watch, name="model-watcher", daemon=True).start()
 
-    def predict(self, image_path):
-        if self.model is None or self.class_names is None:
-            return {"error": "Model not loaded"}, 500
+    def _load_and_watch(self):
+        self.load()
+        self.start_watching()
 
-        try:
-            image = Image.open(image_path).convert("RGB")
-            
-            # Handle EXIF Orientation
+    def _watch(self):
+        tried = self._pointer
+        while True:
+            time.sleep(self.poll_seconds)
             try:
-                image = ImageOps.exif_transpose(image)
-            except Exception:
-                pass # safely ignore if no exif
-                
-            print(f"📸 Processed Image: {image.size} mode={image.mode} path={os.path.basename(image_path)}")
-
-            image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-
-            with torch.no_grad():
-                outputs = self.model(image_tensor)
-                probs = F.softmax(outputs, dim=1)
-                
-                # Get top 5 predictions for debugging
-                top5_prob, top5_idx = torch.topk(probs, 5)
-                print(f"🔍 Top 5 Predictions for {os.path.basename(image_path)}:")
-                for i in range(5):
-                    class_name = self.class_names[top5_idx[0][i].item()]
-                    prob_score = top5_prob[0][i].item()
-                    print(f"   {i+1}. {class_name}: {prob_score*100:.2f}%")
-
-                confidence, pred = torch.max(probs, 1)
-
-            confidence_val = confidence.item()
-            pred_idx = pred.item()
-            
-            THRESHOLD = 0.50
-
-            if confidence_val < THRESHOLD:
-                print(f"⚠️ Rejected: Confidence {confidence_val:.2f} < {THRESHOLD}")
-                return {
-                    "status": "rejected",
-                    "prediction": "Unknown / Low Confidence",
-                    "confidence": round(confidence_val * 100, 2),
-                    "details": "Confidence too low to confirm diagnosis."
-                }
-            else:
-                predicted_class = self.class_names[pred_idx]
-                print(f"✅ Accepted: {predicted_class} ({confidence_val:.2f})")
-                return {
-                    "status": "success",
-                    "prediction": predicted_class,
-                    "confidence": round(confidence_val * 100, 2)
-                }
+                current = model_registry.current_version()
+            except OSError:
+                continue
+            # Compare registry pointers, not model_version: engine and
+            # precision suffixes, or the legacy fallback, make those differ.
+            # A version that failed to load is not retried until CURRENT moves.
+            if current and current != self._pointer and current != tried:
+                tried = current
+                if self.reload(current) and self.status == "failed":
+                    self.error = None
+                    self.status = "ready"
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the model is ready or failed (starting a load if none is running)."""
+        if not self._loaded.is_set():
+            self.load_in_background()
+        self._loaded.wait(timeout)
+        return self.is_ready
+
+    def warm_up(self, runner):
+        """Run throwaway forward passes so the first request does not pay for
+        kernel selection and buffer allocation."""
+        for batch_size in self.warmup_batch_sizes:
+            batch = np.zeros((batch_size, 3, image_pipeline.IMG_SIZE[1], image_pipeline.IMG_SIZE[0]), dtype=np.float32)
+            started = time.perf_counter()
+            runner(batch)
+            logger.info("🔥 Warm-up forward pass (batch %d) took %.0fms", batch_size, (time.perf_counter() - started) * 1000)
+
+    def _build(self, version):
+        """Load and warm up one version (``None`` = legacy fixed paths) as a LoadedModel."""
+        if version is None:
+            manifest = None
+            weights_path = MODEL_PATH
+            if not os.path.exists(CLASS_PATH):
+                raise FileNotFoundError(f"Class file not found at {CLASS_PATH}")
+            class_names = np.load(CLASS_PATH, allow_pickle=True)
+            artifacts = None # engines.ARTIFACT_PATHS
+            model_spec.check(model_spec.load(weights_path), weights_path)
+        else:
+            manifest = model_registry.get_manifest(version)
+            model_spec.check(model_spec.ModelSpec.from_dict(manifest), f"Version {version}")
+            weights_path = model_registry.artifact_path(version, manifest["weights"]["file"])
+            class_names = np.array(manifest["classes"], dtype=object)
+            artifacts = {name: model_registry.artifact_path(version, filename) for name, filename in manifest["artifacts"].items()}
+        logger.info("✅ Loaded %d classes. Sample classes: %s", len(class_names), class_names[:3])
+
+        loaded = None
+        # Load an optimized engine artifact if one was requested
+        if INFERENCE_ENGINE != "eager":
+            try:
+                runner, artifact_path = self._load_engine(INFERENCE_ENGINE, artifacts)
+                loaded = LoadedModel(runner, class_names, f"{self._file_digest(artifact_path)}-{INFERENCE_ENGINE}", INFERENCE_ENGINE, manifest)
+                logger.info("✅ Model loaded successfully (%s engine).", INFERENCE_ENGINE)
+            except Exception as e:
+                logger.warning("⚠️ Could not load '%s' engine (%s), falling back to eager.", INFERENCE_ENGINE, e)
+
+        # Load Model
+        if loaded is None:
+            if not os.path.exists(weights_path):
+                raise FileNotFoundError(f"Model file not found at {weights_path}")
+            runner = self._load_eager_model(weights_path, len(class_names))
+            version = self._file_digest(weights_path)
+            if runner.precision.name != "fp32":
+                version += f"-{runner.precision.name}"
+            loaded = LoadedModel(runner, class_names, version, "eager", manifest)
+            logger.info("✅ Model loaded successfully.")
+
+        self.warm_up(loaded.runner)
+        return loaded
+
+    def _load_engine(self, name, artifacts=None):
+        """Runner for a prebuilt engine; ``artifacts`` maps engine -> path for registry versions."""
+        if artifacts is not None and name not in artifacts:
+            raise FileNotFoundError(f"no '{name}' artifact in this model version (run build_engines.py --version <version>)")
+
+        if name == "onnx":
+            path = artifacts[name] if artifacts else onnx_engine.ONNX_PATH
+            return onnx_engine.OnnxRunner(path), path
+
+        from . import engines
+        path = artifacts[name] if artifacts else engines.ARTIFACT_PATHS[name]
+        module = engines.load_engine(name, map_location=self.device, path=path)
+        return engines.TorchRunner(module), path
+
+    def _load_eager_model(self, weights_path, num_classes):
+        import torch
+        from . import engines, precision
+
+        if MODEL_MMAP:
+            # Build on the meta device (no allocation, no random init) and then
+            # assign the mmap-backed tensors directly as parameters, so the
+            # weights are never copied into process-private memory.
+            with torch.device("meta"):
+                model = engines.build_model(num_classes)
+
+            state_dict = torch.load(weights_path, map_location=self.device, mmap=True, weights_only=True)
+            model.load_state_dict(state_dict, assign=True)
+            logger.info("🗺️  Weights memory-mapped from disk.")
+        else:
+            # Adjust classifier to match training
+            model = engines.build_model(num_classes)
 
+            # Load state dict
+            model.load_state_dict(torch.load(weights_path, map_location=self.device))
+
+        model.to(self.device)
+        model.eval()
+        return engines.TorchRunner(model, precision.resolve(PRECISION, torch.device(self.device)))
+
+    @staticmethod
+    def _file_digest(path):
+        return model_registry.file_digest(path)
+
+    def preprocess(self, source):
+        """Decode an image from a file path, raw bytes or a file-like object."""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        try:
+            with DECODE_SECONDS.time():
+                image = image_pipeline.load_image(source)
+        except Exception:
+            PREDICTIONS.inc(outcome="error", prediction="")
+            raise
+
+        if logger.isEnabledFor(logging.DEBUG):
+            name = os.path.basename(source) if isinstance(source, str) else "<memory>"
+            logger.debug("📸 Processed Image: %s mode=%s path=%s", image.size, image.mode, name)
+
+        with TRANSFORM_SECONDS.time():
+            return image_pipeline.to_array(image)
+
+    def predict(self, source):
+        if not self.is_ready:
+            return {"error": "Model not loaded"}, 500
+
+        try:
+            image_array = self.preprocess(source)
+            return self.predict_batch([image_array])[0]
         except Exception as e:
             return {"error": str(e)}, 500
 
-# Global instance
+    def predict_proba(self, image_arrays):
+        """Class probabilities for preprocessed (3, H, W) arrays, plus the LoadedModel that produced them."""
+        active = self._active # one version for the whole batch, even if a swap lands mid-way
+        try:
+            with FORWARD_SECONDS.time():
+                logits = active.runner(np.stack(image_arrays))
+        except Exception:
+            PREDICTIONS.inc(len(image_arrays), outcome="error", prediction="")
+            raise
+
+        # Softmax
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True), active
+
+    def predict_batch(self, image_arrays):
+        """Run one forward pass over preprocessed (3, H, W) arrays, one result per input."""
+        probs, active = self.predict_proba(image_arrays)
+        return [self.postprocess(p, active) for p in probs]
+
+    def postprocess(self, probs, active=None):
+        """Result dict for one image's class probabilities, applying the rejection threshold."""
+        active = active or self._active
+        pred_idx = int(np.argmax(probs))
+        confidence_val = float(probs[pred_idx])
+        predicted_class = active.class_names[pred_idx]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            # Get top 5 predictions for debugging
+            top5_idx = np.argsort(probs)[::-1][:5]
+            logger.debug("🔍 Top 5 Predictions:\n%s", "\n".join(
+                f"   {i+1}. {active.class_names[idx]}: {probs[idx]*100:.2f}%" for i, idx in enumerate(top5_idx)
+            ))
+
+        if confidence_val < self.threshold:
+            logger.debug("⚠️ Rejected: %s confidence %.2f < %s", predicted_class, confidence_val, self.threshold)
+            PREDICTIONS.inc(outcome="rejected", prediction=predicted_class)
+            return {
+                "status": "rejected",
+                "prediction": "Unknown / Low Confidence",
+                "confidence": round(confidence_val * 100, 2),
+                "details": "Confidence too low to confirm diagnosis.",
+                "model_version": active.version
+            }
+        else:
+            logger.debug("✅ Accepted: %s (%.2f)", predicted_class, confidence_val)
+            PREDICTIONS.inc(outcome="accepted", prediction=predicted_class)
+            return {
+                "status": "success",
+                "prediction": predicted_class,
+                "confidence": round(confidence_val * 100, 2),
+                "model_version": active.version
+            }
+
+# Global instance; call load() / load_in_background() before predicting
 predictor = PlantDiseasePredictor()
@@ -0,0 +1,170 @@
+"""Versioned model artifacts under model/registry.
+
+Each version is a directory named by the weights digest, holding the
+weights, the class list and a manifest.json. A ``CURRENT`` file names the
+active version; workers poll it and hot-swap when it changes, so rolling out
+or back is a single atomic rename:
+
+    python -m backend.model_registry list
+    python -m backend.model_registry activate <version>
+    python -m backend.model_registry publish model/plant_disease_model.pth model/class_indices.npy
+
+Kept free of torch imports like onnx_engine.py.
+"""
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import model_spec
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR") or os.path.join(PROJECT_ROOT, "model", "registry")
+
+WEIGHTS_FILE = "plant_disease_model.pth"
+CLASSES_FILE = "class_indices.npy"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def file_digest(path):
+    """The 8-byte blake2b hex digest the API reports as ``model_version``."""
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, version)
+
+
+def artifact_path(version, filename, registry_dir=REGISTRY_DIR):
+    return os.path.join(version_dir(version, registry_dir), filename)
+
+
+def get_manifest(version, registry_dir=REGISTRY_DIR):
+    with open(artifact_path(version, MANIFEST_FILE, registry_dir)) as f:
+        return json.load(f)
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Manifests of every published version, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    manifests = [
+        get_manifest(name, registry_dir)
+        for name in os.listdir(registry_dir)
+        if os.path.exists(artifact_path(name, MANIFEST_FILE, registry_dir))
+    ]
+    return sorted(manifests, key=lambda m: m["created_at"])
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """The active version, or None when nothing has been activated yet."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(version, registry_dir=REGISTRY_DIR):
+    """Point CURRENT at ``version``; running workers pick it up on their next poll."""
+    if not os.path.exists(artifact_path(version, MANIFEST_FILE, registry_dir)):
+        raise ValueError(f"Unknown model version '{version}'")
+    _write_atomic(os.path.join(registry_dir, CURRENT_FILE), version + "\n")
+
+
+def publish(weights_path, class_path, spec=model_spec.DEFAULT, metrics=None, activate_version=True, registry_dir=REGISTRY_DIR):
+    """Copy trained artifacts into a new version directory and return its manifest.
+
+    The directory is assembled under a temporary name and renamed into place,
+    so a reader never sees a half-written version. Publishing identical
+    weights again reuses the existing version.
+    """
+    version = file_digest(weights_path)
+    target = version_dir(version, registry_dir)
+
+    if not os.path.exists(target):
+        class_names = np.load(class_path, allow_pickle=True)
+        staging = f"{target}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(staging)
+        shutil.copyfile(weights_path, os.path.join(staging, WEIGHTS_FILE))
+        shutil.copyfile(class_path, os.path.join(staging, CLASSES_FILE))
+
+        manifest = {
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **spec.to_dict(),
+            "classes": [str(name) for name in class_names],
+            "weights": {"file": WEIGHTS_FILE, "blake2b": version, "bytes": os.path.getsize(weights_path)},
+            "metrics": metrics or {},
+            "artifacts": {},
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+
+    if activate_version:
+        activate(version, registry_dir)
+    return get_manifest(version, registry_dir)
+
+
+def add_artifact(version, engine, source_path, registry_dir=REGISTRY_DIR):
+    """Attach a built engine artifact (fused / int8 / onnx) to ``version``."""
+    filename = os.path.basename(source_path)
+    target = artifact_path(version, filename, registry_dir)
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, target)
+
+    manifest = get_manifest(version, registry_dir)
+    manifest["artifacts"][engine] = filename
+    _write_atomic(artifact_path(version, MANIFEST_FILE, registry_dir), json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned model artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show published versions")
+    activate_parser = sub.add_parser("activate", help="roll out (or back) to a version")
+    activate_parser.add_argument("version")
+    publish_parser = sub.add_parser("publish", help="publish existing weights as a new version")
+    publish_parser.add_argument("weights")
+    publish_parser.add_argument("classes")
+    publish_parser.add_argument("--no-activate", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version()
+        for manifest in list_versions():
+            marker = "*" if manifest["version"] == current else " "
+            metrics = " ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in manifest["metrics"].items())
+            engines = ",".join(sorted(manifest["artifacts"])) or "-"
+            print(f"{marker} {manifest['version']}  {manifest['created_at']}  {len(manifest['classes'])} classes  engines={engines}  {metrics}")
+    elif args.command == "activate":
+        activate(args.version)
+        print(f"✅ Activated {args.version}")
+    else:
+        manifest = publish(args.weights, args.classes, model_spec.load(args.weights), activate_version=not args.no_activate)
+        print(f"✅ Published {manifest['version']}" + ("" if args.no_activate else " (active)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""The one definition of what the model expects as input.
+
+Training, evaluation, engine building, the API and the Streamlit app all
+read the architecture, input size and normalization from here instead of
+keeping their own copies. The values are also written next to the weights
+(``<weights>.json``, and the registry manifest), and the predictor refuses
+to serve weights whose recorded spec differs from the one it preprocesses
+for.
+
+Kept free of torch imports like onnx_engine.py.
+"""
+import os
+import json
+
+ARCHITECTURE = "mobilenet_v2"
+INPUT_SIZE = (160, 160) # (width, height)
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+class ModelSpec:
+    __slots__ = ("architecture", "input_size", "mean", "std")
+
+    def __init__(self, architecture=ARCHITECTURE, input_size=INPUT_SIZE, mean=MEAN, std=STD):
+        self.architecture = architecture
+        self.input_size = tuple(int(v) for v in input_size)
+        self.mean = tuple(float(v) for v in mean)
+        self.std = tuple(float(v) for v in std)
+
+    def __eq__(self, other):
+        return isinstance(other, ModelSpec) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"ModelSpec({self.architecture}, {self.input_size[0]}x{self.input_size[1]})"
+
+    def to_dict(self):
+        return {
+            "architecture": self.architecture,
+            "input_size": list(self.input_size),
+            "normalization": {"mean": list(self.mean), "std": list(self.std)},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Read a spec from a sidecar or manifest; older files without normalization get the defaults."""
+        normalization = data.get("normalization", {})
+        return cls(
+            data.get("architecture", ARCHITECTURE),
+            data.get("input_size", INPUT_SIZE),
+            normalization.get("mean", MEAN),
+            normalization.get("std", STD),
+        )
+
+
+DEFAULT = ModelSpec()
+
+
+def sidecar_path(weights_path):
+    return os.path.splitext(weights_path)[0] + ".json"
+
+
+def save(weights_path, spec=DEFAULT):
+    """Write ``spec`` next to ``weights_path`` (model/plant_disease_model.json)."""
+    with open(sidecar_path(weights_path), "w") as f:
+        json.dump(spec.to_dict(), f, indent=2)
+
+
+def load(weights_path):
+    """The spec recorded next to ``weights_path``; weights from before it was recorded get the default."""
+    try:
+        with open(sidecar_path(weights_path)) as f:
+            return ModelSpec.from_dict(json.load(f))
+    except FileNotFoundError:
+        return DEFAULT
+
+
+def check(spec, source):
+    """Raise if weights described by ``spec`` cannot be served with the default preprocessing."""
+    if spec != DEFAULT:
+        raise ValueError(f"{source} was trained for {spec.to_dict()}, the predictor preprocesses for {DEFAULT.to_dict()}")
@@ -29,8 +29,16 @@ class Prediction(db.Model):
     image_path = db.Column(db.String(255), nullable=False) # Store relative path or filename
     prediction = db.Column(db.String(100), nullable=False)
     confidence = db.Column(db.Float, nullable=False)
+    model_version = db.Column(db.String(64)) # predictor.model_version that produced it; NULL for older rows
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Serves /api/history's per-user, newest-first keyset pagination, and
+    # the "is this upload still used" checks of deletes and the reclaimer
+    __table_args__ = (
+        db.Index('ix_predictions_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_predictions_image_path', 'image_path'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -38,5 +46,36 @@ class Prediction(db.Model):
             "image_path": self.image_path,
             "prediction": self.prediction,
             "confidence": self.confidence,
+            "model_version": self.model_version,
             "created_at": self.created_at.isoformat()
         }
+
+class PredictionStat(db.Model):
+    """Per user, UTC day and class rollup of ``predictions``, kept in step by backend/stats.py."""
+    __tablename__ = 'prediction_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    prediction = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0) # mean = confidence_sum / count
+
+class PredictionJob(db.Model):
+    __tablename__ = 'prediction_jobs'
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    image_path = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued | running | done | failed
+    result = db.Column(db.JSON)
+    prediction_id = db.Column(db.Integer, db.ForeignKey('predictions.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "prediction_id": self.prediction_id,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
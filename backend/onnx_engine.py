@@ -0,0 +1,49 @@
+import os
+import threading
+
+# Deliberately free of torch imports: with INFERENCE_ENGINE=onnx the API
+# process never loads torch or torchvision.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+ONNX_PATH = os.path.join(PROJECT_ROOT, "model", "plant_disease_model.onnx")
+
+# 0 lets ONNX Runtime pick (one thread per physical core)
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 0))
+
+
+class OnnxRunner:
+    """Runs the exported graph with ONNX Runtime on CPU.
+
+    Takes a float32 NCHW batch and returns float32 logits, like the torch
+    runners. ONNX Runtime's thread pools do not survive fork, so the session
+    is created on first use in each process rather than in the gunicorn
+    master.
+    """
+
+    def __init__(self, path=ONNX_PATH, threads=ONNX_THREADS):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run build_engines.py --engines onnx first")
+        self.path = path
+        self.threads = threads
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._session is None or self._pid != pid:
+                import onnxruntime as ort
+
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                self._session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+                self._input_name = self._session.get_inputs()[0].name
+                self._pid = pid
+            return self._session
+
+    def __call__(self, batch):
+        session = self._get_session()
+        return session.run(None, {self._input_name: batch})[0]
@@ -0,0 +1,73 @@
+import contextlib
+import logging
+
+import torch
+
+# fp32:              float32, default contiguous (NCHW) layout
+# channels_last:     float32 with NHWC memory format (faster depthwise convs in oneDNN)
+# bf16:              bfloat16 autocast
+# bf16+channels_last both of the above
+MODES = ("fp32", "channels_last", "bf16", "bf16+channels_last")
+
+logger = logging.getLogger(__name__)
+
+
+def bf16_supported(device):
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    # True when oneDNN has native bf16 kernels for this CPU (AVX512-BF16 / AMX);
+    # without them bf16 is emulated and slower than fp32.
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def channels_last_supported(device):
+    return device.type == "cuda" or torch.backends.mkldnn.is_available()
+
+
+class Precision:
+    """How a torch model and its inputs are laid out and which dtype it computes in."""
+
+    def __init__(self, bf16=False, channels_last=False):
+        self.bf16 = bf16
+        self.channels_last = channels_last
+
+    @property
+    def name(self):
+        parts = (["bf16"] if self.bf16 else []) + (["channels_last"] if self.channels_last else [])
+        return "+".join(parts) or "fp32"
+
+    def prepare_model(self, model):
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        return model
+
+    def prepare_input(self, inputs):
+        if self.channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+        return inputs
+
+    def autocast(self, device):
+        if self.bf16:
+            return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+
+def resolve(mode, device=torch.device("cpu")):
+    """Parse ``mode`` and drop whatever this machine cannot run efficiently."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown precision '{mode}', expected one of {MODES}")
+
+    bf16 = "bf16" in mode
+    channels_last = "channels_last" in mode
+
+    if bf16 and not bf16_supported(device):
+        logger.warning("⚠️ bf16 not supported natively on this %s, falling back to fp32", device.type)
+        bf16 = False
+    if channels_last and not channels_last_supported(device):
+        logger.warning("⚠️ channels_last needs oneDNN (mkldnn), falling back to contiguous layout")
+        channels_last = False
+
+    return Precision(bf16=bf16, channels_last=channels_last)
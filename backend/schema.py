@@ -0,0 +1,31 @@
+from .models import db
+
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models.
+
+    ``db.create_all()`` only creates missing tables; columns and indexes added
+    to a table that already exists have to be created separately. New columns
+    must be nullable (or have a server default). Safe to run repeatedly.
+    """
+    db.create_all()
+    add_missing_columns()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def add_missing_columns():
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                print(f"🛠️  Added column {table.name}.{column.name}")
@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import db, Prediction, PredictionStat
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _deltas(rows):
+    """Group prediction rows (dicts or ``Prediction`` objects) into ``{(user_id, day, class): [count, confidence_sum]}``."""
+    deltas = defaultdict(lambda: [0, 0.0])
+    for row in rows:
+        created_at = _field(row, "created_at")
+        if created_at is None:
+            continue
+        delta = deltas[(_field(row, "user_id"), created_at.date(), _field(row, "prediction"))]
+        delta[0] += 1
+        delta[1] += _field(row, "confidence")
+    return deltas
+
+
+def record_inserted(session, rows):
+    """Add freshly inserted predictions to the rollup, in the caller's transaction.
+
+    Rows need ``created_at`` set by the caller (the column default is only
+    applied at flush). One upsert per rollup row, so concurrent inserts for
+    the same user, day and class add up instead of racing.
+    """
+    deltas = _deltas(rows)
+    if not deltas:
+        return
+    values = [
+        {"user_id": user_id, "day": day, "prediction": prediction, "count": count, "confidence_sum": confidence_sum}
+        for (user_id, day, prediction), (count, confidence_sum) in deltas.items()
+    ]
+
+    insert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(PredictionStat).values(values)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[PredictionStat.user_id, PredictionStat.day, PredictionStat.prediction],
+            set_={
+                "count": PredictionStat.count + statement.excluded.count,
+                "confidence_sum": PredictionStat.confidence_sum + statement.excluded.confidence_sum,
+            },
+        ))
+        return
+
+    for value in values:
+        updated = session.execute(_bump(value, 1))
+        if updated.rowcount == 0:
+            session.execute(db.insert(PredictionStat).values(**value))
+
+
+def record_deleted(session, rows):
+    """Take deleted predictions out of the rollup, dropping rollup rows that reach zero."""
+    for (user_id, day, prediction), (count, confidence_sum) in _deltas(rows).items():
+        key = {"user_id": user_id, "day": day, "prediction": prediction}
+        session.execute(_bump({**key, "count": count, "confidence_sum": confidence_sum}, -1))
+        session.execute(db.delete(PredictionStat).where(_matches(key), PredictionStat.count <= 0))
+
+
+def _matches(key):
+    return db.and_(
+        PredictionStat.user_id == key["user_id"],
+        PredictionStat.day == key["day"],
+        PredictionStat.prediction == key["prediction"],
+    )
+
+
+def _bump(value, sign):
+    return db.update(PredictionStat).where(_matches(value)).values(
+        count=PredictionStat.count + sign * value["count"],
+        confidence_sum=PredictionStat.confidence_sum + sign * value["confidence_sum"],
+    )
+
+
+def backfill(session):
+    """Rebuild the whole rollup from ``predictions`` in one transaction; returns the number of rollup rows.
+
+    Predictions committed while this runs may be counted twice or not at
+    all, so run it with writes paused (e.g. before the workers start).
+    """
+    day = db.func.date(Prediction.created_at)
+    source = (
+        db.select(
+            Prediction.user_id,
+            day,
+            Prediction.prediction,
+            db.func.count(Prediction.id),
+            db.func.sum(Prediction.confidence),
+        )
+        .where(Prediction.created_at.is_not(None))
+        .group_by(Prediction.user_id, day, Prediction.prediction)
+    )
+    session.execute(db.delete(PredictionStat))
+    session.execute(db.insert(PredictionStat).from_select(
+        ["user_id", "day", "prediction", "count", "confidence_sum"], source
+    ))
+    rows = session.scalar(db.select(db.func.count()).select_from(PredictionStat))
+    session.commit()
+    return rows
+
+
+def summarize(session, user_id, since=None, until=None, prediction=None):
+    """Totals, per-class and per-day counts with mean confidence for one user.
+
+    ``since`` / ``until`` are inclusive dates. Reads only the rollup, so the
+    cost depends on the number of days and classes, not on history size.
+    """
+    query = (
+        db.select(
+            PredictionStat.day,
+            PredictionStat.prediction,
+            db.func.sum(PredictionStat.count).label("count"),
+            db.func.sum(PredictionStat.confidence_sum).label("confidence_sum"),
+        )
+        .where(PredictionStat.user_id == user_id)
+        .group_by(PredictionStat.day, PredictionStat.prediction)
+    )
+    if since:
+        query = query.where(PredictionStat.day >= since)
+    if until:
+        query = query.where(PredictionStat.day <= until)
+    if prediction:
+        query = query.where(PredictionStat.prediction == prediction)
+
+    total = [0, 0.0]
+    by_class = defaultdict(lambda: [0, 0.0])
+    by_day = defaultdict(lambda: [0, 0.0, {}])
+    for row in session.execute(query):
+        if row.count <= 0:
+            continue
+        for bucket in (total, by_class[row.prediction], by_day[row.day]):
+            bucket[0] += row.count
+            bucket[1] += row.confidence_sum
+        by_day[row.day][2][row.prediction] = row.count
+
+    return {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "count": total[0],
+        "mean_confidence": _mean(*total),
+        "by_class": [
+            {"prediction": name, "count": count, "mean_confidence": _mean(count, confidence_sum)}
+            for name, (count, confidence_sum) in sorted(by_class.items(), key=lambda item: -item[1][0])
+        ],
+        "by_day": [
+            {"day": day.isoformat(), "count": count, "mean_confidence": _mean(count, confidence_sum), "classes": classes}
+            for day, (count, confidence_sum, classes) in sorted(by_day.items())
+        ],
+    }
+
+
+def _mean(count, confidence_sum):
+    return round(confidence_sum / count, 4) if count else None
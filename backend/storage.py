@@ -0,0 +1,178 @@
+import os
+import uuid
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError: # Windows: no advisory locks
+    fcntl = None
+
+
+class Storage:
+    """Where uploads and their derivatives are kept.
+
+    Objects are addressed by flat names (``<digest>.jpg``,
+    ``<digest>.thumb.webp``); how they are laid out is up to the
+    implementation. ``path`` must return a local file for ``send_file``.
+    """
+
+    def save(self, name, data):
+        """Store ``data`` under ``name`` unless it already exists; returns its path.
+
+        Saving a name that exists refreshes its modification time, so a
+        re-upload of the same bytes restarts the reclaim grace period.
+        """
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def path(self, name):
+        raise NotImplementedError
+
+    def mtime(self, name):
+        """Modification time of ``name`` as a Unix timestamp, or None if it is missing."""
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Remove ``name``; returns the number of bytes freed (0 if it was missing)."""
+        raise NotImplementedError
+
+    def scan(self):
+        """Yield ``[(name, size, mtime), ...]`` groups. All names sharing a
+        digest prefix (an upload and its derivatives) come in the same group."""
+        raise NotImplementedError
+
+    def migrate_legacy(self):
+        """Move objects from an older layout into the current one; returns how many moved."""
+        return 0
+
+    def lock(self, name, blocking=True):
+        """Exclusive lock ``name`` held across every process using this storage.
+
+        Returns a handle to ``close()`` when done, ``False`` if another holder
+        has it and ``blocking`` is false, or ``None`` if locks are not
+        supported (then every caller proceeds).
+        """
+        return None
+
+
+class LocalStorage(Storage):
+    """Files under ``root``, sharded by name prefix: ``ab/cd/abcd1234….jpg``.
+
+    With 2 levels of 2 hex characters there are 65536 leaf directories, so a
+    million uploads is about 15 files per directory (plus derivatives) and
+    lookups never hit a huge flat listing. Files written before sharding sit
+    directly in ``root``; they are still found (``path``/``exists``/``delete``
+    fall back to them) and ``migrate_legacy`` moves them into their shard.
+    """
+
+    SHARD_DEPTH = 2
+    SHARD_WIDTH = 2
+
+    def __init__(self, root):
+        self.root = root
+
+    def _shard_dir(self, name):
+        parts = [name[i * self.SHARD_WIDTH:(i + 1) * self.SHARD_WIDTH] for i in range(self.SHARD_DEPTH)]
+        return os.path.join(self.root, *parts)
+
+    def _sharded_path(self, name):
+        return os.path.join(self._shard_dir(name), name)
+
+    def _legacy_path(self, name):
+        return os.path.join(self.root, name)
+
+    def path(self, name):
+        sharded = self._sharded_path(name)
+        if not os.path.exists(sharded) and os.path.isfile(self._legacy_path(name)):
+            return self._legacy_path(name)
+        return sharded
+
+    def exists(self, name):
+        return os.path.exists(self._sharded_path(name)) or os.path.isfile(self._legacy_path(name))
+
+    def save(self, name, data):
+        if self.exists(name):
+            path = self.path(name)
+            try:
+                os.utime(path)
+            except FileNotFoundError: # deleted meanwhile: write it again below
+                pass
+            else:
+                return path
+        path = self._sharded_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent identical uploads never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def mtime(self, name):
+        try:
+            return os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, name):
+        freed = 0
+        for path in (self._sharded_path(name), self._legacy_path(name)):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except (FileNotFoundError, IsADirectoryError):
+                pass
+        return freed
+
+    def scan(self):
+        # One group per leaf shard directory. Not yet migrated flat files join
+        # the group of the shard they belong in, next to their derivatives.
+        legacy = defaultdict(list)
+        for entry in self._files(self.root):
+            legacy[self._shard_dir(entry[0])].append(entry)
+        for shard in self._leaf_dirs(self.root, self.SHARD_DEPTH):
+            yield list(self._files(shard)) + legacy.pop(shard, [])
+        for group in legacy.values():
+            yield group
+
+    @staticmethod
+    def _files(directory):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime
+
+    def _leaf_dirs(self, directory, depth):
+        with os.scandir(directory) as entries:
+            dirs = sorted(e.path for e in entries if e.is_dir() and len(e.name) == self.SHARD_WIDTH)
+        for path in dirs:
+            if depth == 1:
+                yield path
+            else:
+                yield from self._leaf_dirs(path, depth - 1)
+
+    def lock(self, name, blocking=True):
+        if fcntl is None:
+            return None
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(os.path.join(self.root, f".{name}.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        return lock_file
+
+    def migrate_legacy(self):
+        """Move flat pre-sharding files into their shard; returns how many moved."""
+        moved = 0
+        for name, _, _ in list(self._files(self.root)):
+            target = self._sharded_path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self._legacy_path(name), target)
+            moved += 1
+        return moved
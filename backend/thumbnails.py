@@ -0,0 +1,53 @@
+import io
+
+from PIL import Image, ImageOps
+
+from .metrics import registry
+
+# Longest side in pixels for each derivative served from /uploads/<size>/<filename>.
+# thumb covers the 50px history cell on 2x screens; medium is for previews.
+SIZES = {"thumb": 128, "medium": 640}
+FORMAT = "WEBP"
+EXTENSION = "webp"
+QUALITY = 80
+MIMETYPE = "image/webp"
+
+THUMBNAIL_SECONDS = registry.histogram(
+    "upload_thumbnail_seconds",
+    "Time to decode an upload and write all of its derivative sizes",
+)
+
+
+def derivative_name(filename, size):
+    """``<digest>.jpg`` -> ``<digest>.thumb.webp``, stored alongside the original."""
+    return f"{filename.rsplit('.', 1)[0]}.{size}.{EXTENSION}"
+
+
+def generate(storage, filename, source=None):
+    """Write every derivative of an upload, skipping sizes that already exist.
+
+    ``source`` is the original as a path or file-like object (default: the
+    stored file). The image is decoded once, at the smallest JPEG draft
+    scale that still covers the largest size.
+    """
+    missing = [size for size in SIZES if not storage.exists(derivative_name(filename, size))]
+    if not missing:
+        return
+
+    with THUMBNAIL_SECONDS.time():
+        image = Image.open(source or storage.path(filename))
+        if image.format == "JPEG":
+            side = max(SIZES[size] for size in missing)
+            image.draft("RGB", (side, side))
+        try:
+            image = ImageOps.exif_transpose(image)
+        except Exception:
+            pass # safely ignore if no exif
+        image = image.convert("RGB")
+
+        # Largest first, so each smaller size is resized from the previous one
+        for size in sorted(missing, key=SIZES.get, reverse=True):
+            image.thumbnail((SIZES[size], SIZES[size]), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, FORMAT, quality=QUALITY, method=4)
+            storage.save(derivative_name(filename, size), buffer.getvalue())
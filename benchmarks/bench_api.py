@@ -0,0 +1,256 @@
+"""Load-test /api/predict and /api/history at a fixed concurrency.
+
+Targets (pick one):
+  default       in-process Flask test client (no network, no gunicorn)
+  --gunicorn    start gunicorn -c gunicorn.conf.py on a free local port
+  --url URL     an already running server
+
+The in-process and --gunicorn targets run against a throwaway SQLite database
+and upload folder. Every predict request gets a unique JPEG (random trailing
+bytes) so the prediction cache is not hit; pass --repeat-image to measure the
+cached path instead.
+
+Usage: python benchmarks/bench_api.py [--gunicorn] [--concurrency 8] [--requests 200] [--output out.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+class TestClientTarget:
+    """Calls the app in-process through Flask's test client."""
+
+    name = "test_client"
+
+    def __init__(self):
+        from backend.app import app, predictor
+        from backend.schema import upgrade_schema
+        self.app = app
+        # Schema upgrade notes go to stderr so stdout stays valid JSON
+        with app.app_context(), contextlib.redirect_stdout(sys.stderr):
+            upgrade_schema()
+        if not predictor.wait_until_ready():
+            raise RuntimeError(f"model failed to load: {predictor.error}")
+
+    def request(self, method, path, token=None, json_body=None, image=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        kwargs = {"headers": headers}
+        if json_body is not None:
+            kwargs["json"] = json_body
+        if image is not None:
+            kwargs["data"] = {"image": (io.BytesIO(image), "bench.jpg")}
+            kwargs["content_type"] = "multipart/form-data"
+        response = self.app.test_client().open(path, method=method, **kwargs)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTarget:
+    """Calls a server over HTTP with urllib (one connection per request)."""
+
+    name = "http"
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def request(self, method, path, token=None, json_body=None, image=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        if image is not None:
+            boundary = uuid.uuid4().hex
+            body = (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="image"; filename="bench.jpg"\r\n'
+                f"Content-Type: image/jpeg\r\n\r\n"
+            ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+
+        req = urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env, timeout=120):
+    # Same deploy step as render.yaml: schema first, then the workers
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "backend.app", "init-db"],
+        cwd=PROJECT_ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "backend.app:app"],
+        cwd=PROJECT_ROOT,
+        env={**env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            # Ready once a worker has loaded and warmed up the model
+            urllib.request.urlopen(url + "/readyz", timeout=1).close()
+            return process, url
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not answer on {url} within {timeout}s")
+
+
+def login(target):
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    credentials = {"name": "bench", "email": email, "password": "bench-password"}
+    target.request("POST", "/api/register", json_body=credentials)
+    status, body = target.request("POST", "/api/login", json_body=credentials)
+    if status != 200:
+        raise RuntimeError(f"login failed with HTTP {status}")
+    return body["access_token"]
+
+
+def run_scenario(make_request, total, concurrency):
+    """Issue ``total`` requests from ``concurrency`` threads; latency per request."""
+    latencies = np.empty(total)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        status = make_request(i)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        with lock:
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "throughput_rps": total / elapsed,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": summarize(latencies),
+    }
+
+
+def run(args, image):
+    """Run the selected scenarios against the chosen target; returns (target name, results)."""
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    gunicorn = None
+    if not args.url:
+        # Keep benchmark rows and uploads out of the real database and upload folder
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        os.environ.setdefault("UPLOAD_FOLDER", os.path.join(workdir, "uploads"))
+
+    try:
+        if args.url:
+            target = HttpTarget(args.url)
+        elif args.gunicorn:
+            gunicorn, url = start_gunicorn(dict(os.environ))
+            target = HttpTarget(url)
+            target.name = "gunicorn"
+        else:
+            target = TestClientTarget()
+
+        token = login(target)
+
+        def predict(i):
+            payload = image if args.repeat_image else image + os.urandom(16)
+            return target.request("POST", "/api/predict", token=token, image=payload)[0]
+
+        def history(i):
+            return target.request("GET", f"/api/history?limit={args.history_limit}", token=token)[0]
+
+        scenarios = {"predict": predict, "history": history}
+        results = {}
+        for name in args.scenarios:
+            results[name] = run_scenario(scenarios[name], args.requests, args.concurrency)
+            print(f"✅ {name}: {results[name]['throughput_rps']:.1f} req/s, "
+                  f"p50 {results[name]['latency']['p50_ms']:.1f}ms "
+                  f"p99 {results[name]['latency']['p99_ms']:.1f}ms", file=sys.stderr)
+    finally:
+        if gunicorn is not None:
+            gunicorn.terminate()
+            gunicorn.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return target.name, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument("--url", help="benchmark an already running server")
+    target_group.add_argument("--gunicorn", action="store_true", help="start a local gunicorn for the run")
+    parser.add_argument("--image", default=os.path.join(PROJECT_ROOT, "test.jpg"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--history-limit", type=int, default=50)
+    parser.add_argument("--repeat-image", action="store_true", help="send identical bytes (prediction cache hits)")
+    parser.add_argument("--scenarios", nargs="+", choices=["predict", "history"], default=["predict", "history"])
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image = f.read()
+
+    target_name, results = run(args, image)
+
+    report = {
+        "target": target_name,
+        "unique_images": not args.repeat_image,
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
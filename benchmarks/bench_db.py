@@ -0,0 +1,90 @@
+"""Concurrent predict-and-insert throughput per database backend.
+
+Runs bench_api.py's predict scenario (each request runs the model and inserts
+a Prediction row) once per backend, each in a fresh process so it gets its own
+engine configuration:
+
+  sqlite-wal      throwaway SQLite file, WAL + busy_timeout (the app default)
+  sqlite-delete   throwaway SQLite file, rollback journal (SQLite's own default)
+  postgres        --postgres-url (skipped when not given; use a scratch database)
+
+With --gunicorn the writers are separate worker processes, which is where the
+SQLite journal mode matters most. --repeat-image serves predictions from the
+cache so the database insert dominates.
+
+Usage: python benchmarks/bench_db.py [--gunicorn] [--concurrency 16] [--requests 400] [--postgres-url URL] [--output out.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_API = os.path.join(PROJECT_ROOT, "benchmarks", "bench_api.py")
+
+
+def backends(args, workdir):
+    yield "sqlite-wal", {"DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'wal.db')}", "SQLITE_JOURNAL_MODE": "WAL"}
+    yield "sqlite-delete", {"DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'delete.db')}", "SQLITE_JOURNAL_MODE": "DELETE"}
+    if args.postgres_url:
+        yield "postgres", {"DATABASE_URL": args.postgres_url}
+
+
+def run_backend(args, env, output_path):
+    command = [
+        sys.executable, BENCH_API,
+        "--scenarios", "predict",
+        "--concurrency", str(args.concurrency),
+        "--requests", str(args.requests),
+        "--output", output_path,
+    ]
+    if args.gunicorn:
+        command.append("--gunicorn")
+    if args.repeat_image:
+        command.append("--repeat-image")
+    subprocess.run(command, cwd=PROJECT_ROOT, env={**os.environ, **env}, check=True, stdout=subprocess.DEVNULL)
+    with open(output_path) as f:
+        return json.load(f)["scenarios"]["predict"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gunicorn", action="store_true", help="run each backend behind a local gunicorn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--repeat-image", action="store_true", help="send identical bytes (prediction cache hits)")
+    parser.add_argument("--postgres-url", help="also benchmark this PostgreSQL database")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-db-")
+    results = {}
+    try:
+        for name, env in backends(args, workdir):
+            env["UPLOAD_FOLDER"] = os.path.join(workdir, f"uploads-{name}")
+            result = run_backend(args, env, os.path.join(workdir, f"{name}.json"))
+            results[name] = result
+            print(f"✅ {name}: {result['throughput_rps']:.1f} req/s, "
+                  f"p50 {result['latency']['p50_ms']:.1f}ms p99 {result['latency']['p99_ms']:.1f}ms, "
+                  f"{result['errors']} errors", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "target": "gunicorn" if args.gunicorn else "test_client",
+        "concurrency": args.concurrency,
+        "unique_images": not args.repeat_image,
+        "backends": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
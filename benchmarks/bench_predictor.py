@@ -0,0 +1,135 @@
+"""Time PlantDiseasePredictor stage by stage and sweep the forward batch size.
+
+Honours the same INFERENCE_ENGINE / PRECISION / MODEL_MMAP settings as the API.
+
+Usage: python benchmarks/bench_predictor.py [--image test.jpg] [--batch-sizes 1 4 16] [--output out.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend import image_pipeline
+
+STAGES = ("decode", "transform", "forward", "postprocess")
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def load_jpeg(image_path, width=None, height=None, quality=90):
+    """Raw bytes of ``image_path``, re-encoded at ``width`` x ``height`` when given."""
+    if not width or not height:
+        with open(image_path, "rb") as f:
+            return f.read()
+    image = Image.open(image_path).convert("RGB").resize((width, height), Image.BICUBIC)
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def bench_stages(predictor, data, iterations, warmup=3):
+    """Single-image predict() split into its stages, plus the end-to-end call."""
+    timings = {stage: [] for stage in STAGES + ("total", "predict")}
+
+    for i in range(warmup + iterations):
+        t0 = time.perf_counter()
+        image = image_pipeline.load_image(io.BytesIO(data))
+        t1 = time.perf_counter()
+        array = image_pipeline.to_array(image)
+        t2 = time.perf_counter()
+        probs, active = predictor.predict_proba([array])
+        t3 = time.perf_counter()
+        predictor.postprocess(probs[0], active)
+        t4 = time.perf_counter()
+        predictor.predict(data)
+        t5 = time.perf_counter()
+
+        if i < warmup:
+            continue
+        for stage, start, end in zip(STAGES + ("total", "predict"), (t0, t1, t2, t3, t0, t4), (t1, t2, t3, t4, t4, t5)):
+            timings[stage].append((end - start) * 1000)
+
+    result = {stage: summarize(samples) for stage, samples in timings.items()}
+    total = result["total"]["mean_ms"]
+    for stage in STAGES:
+        result[stage]["share"] = result[stage]["mean_ms"] / total
+    return result
+
+
+def bench_batch_sizes(predictor, data, batch_sizes, iterations, warmup=2):
+    """Forward-pass latency and throughput for each batch size."""
+    array = image_pipeline.preprocess(io.BytesIO(data))
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.repeat(array[np.newaxis], batch_size, axis=0)
+        samples = []
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            predictor.model(batch)
+            if i >= warmup:
+                samples.append((time.perf_counter() - start) * 1000)
+        stats = summarize(samples)
+        stats["images_per_sec"] = batch_size * 1000 / stats["mean_ms"]
+        results[str(batch_size)] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=os.path.join(PROJECT_ROOT, "test.jpg"))
+    parser.add_argument("--width", type=int, help="re-encode the image at this size (e.g. 4032 for a phone photo)")
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    data = load_jpeg(args.image, args.width, args.height)
+
+    # Model loading logs go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        from backend.ml_utils import predictor
+        if not predictor.load():
+            sys.exit(f"❌ Model not loaded: {predictor.error}")
+
+    stages = bench_stages(predictor, data, args.iterations)
+    sweep = bench_batch_sizes(predictor, data, args.batch_sizes, args.iterations)
+
+    with Image.open(io.BytesIO(data)) as image:
+        size = f"{image.width}x{image.height}"
+
+    report = {
+        "engine": predictor.engine,
+        "model_version": predictor.model_version,
+        "image": size,
+        "jpeg_bytes": len(data),
+        "iterations": args.iterations,
+        "stages": stages,
+        "batch_sizes": sweep,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
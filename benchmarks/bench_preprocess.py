@@ -0,0 +1,86 @@
+"""Compare the draft-mode preprocessing pipeline with the torchvision path.
+
+Usage: python benchmarks/bench_preprocess.py [--image test.jpg] [--width 4032 --height 3024]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend import image_pipeline
+
+
+def legacy_preprocess(data):
+    # The PIL -> Resize -> ToTensor -> Normalize path the predictor used before
+    transform = transforms.Compose([
+        transforms.Resize(image_pipeline.IMG_SIZE),
+        transforms.ToTensor(),
+        transforms.Normalize(image_pipeline.MEAN.tolist(), image_pipeline.STD.tolist())
+    ])
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    return transform(image).numpy()
+
+
+def fast_preprocess(data):
+    return image_pipeline.preprocess(io.BytesIO(data))
+
+
+def make_jpeg(image_path, width, height, quality=90):
+    """Upscale a sample photo to phone-camera resolution and JPEG-encode it."""
+    image = Image.open(image_path).convert("RGB").resize((width, height), Image.BICUBIC)
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def time_it(fn, data, iterations, warmup=2):
+    for _ in range(warmup):
+        fn(data)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(data)
+        samples.append(time.perf_counter() - start)
+    samples = np.array(samples) * 1000
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", default=os.path.join(PROJECT_ROOT, "test.jpg"))
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_jpeg(args.image, args.width, args.height)
+
+    legacy = time_it(legacy_preprocess, data, args.iterations)
+    fast = time_it(fast_preprocess, data, args.iterations)
+    max_abs_diff = float(np.abs(legacy_preprocess(data) - fast_preprocess(data)).max())
+
+    print(json.dumps({
+        "image": f"{args.width}x{args.height}",
+        "jpeg_bytes": len(data),
+        "legacy": legacy,
+        "fast": fast,
+        "speedup": legacy["mean_ms"] / fast["mean_ms"],
+        "max_abs_diff": max_abs_diff,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import argparse
+import torch
+import numpy as np
+from torchvision import datasets
+from torch.utils.data import DataLoader, Subset
+
+from backend import engines, image_pipeline, model_registry
+from backend.onnx_engine import OnnxRunner
+
+# =========================
+# CONFIGURATION
+# =========================
+CALIBRATION_DIR = "dataset/PlantVillage/val"
+CALIBRATION_SIZE = 512
+BATCH_SIZE = 32
+
+# Max logit difference allowed between the ONNX Runtime and PyTorch outputs
+ONNX_TOLERANCE = 1e-4
+
+MODEL_PATH = "model/plant_disease_model.pth"
+CLASS_PATH = "model/class_indices.npy"
+
+
+def to_tensor(image):
+    return torch.from_numpy(image_pipeline.to_array(image))
+
+
+def calibration_batches(data_dir, size, seed=0):
+    """Random sample of validation images, preprocessed exactly like the API does."""
+    dataset = datasets.ImageFolder(data_dir, transform=to_tensor, loader=image_pipeline.load_image)
+    indices = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(seed))[:size]
+    loader = DataLoader(Subset(dataset, indices.tolist()), batch_size=BATCH_SIZE, shuffle=False)
+    for inputs, _ in loader:
+        yield inputs
+
+
+def publish_artifact(version, name):
+    if version:
+        model_registry.add_artifact(version, name, engines.ARTIFACT_PATHS[name])
+        print(f"📦 Attached '{name}' to version {version}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build optimized inference engines from the trained model")
+    parser.add_argument("--engines", nargs="+", default=["fused", "int8", "onnx"], choices=["fused", "int8", "onnx"])
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--calibration-size", type=int, default=CALIBRATION_SIZE)
+    parser.add_argument("--version", default=model_registry.current_version(),
+                        help="registry version to build from and attach the engines to (default: the active one)")
+    args = parser.parse_args()
+
+    if args.version:
+        # Build from the registered weights so the engines match that version exactly
+        manifest = model_registry.get_manifest(args.version)
+        class_names = manifest["classes"]
+        weights_path = model_registry.artifact_path(args.version, manifest["weights"]["file"])
+        print(f"📦 Building engines for registry version {args.version}")
+    else:
+        class_names = np.load(CLASS_PATH, allow_pickle=True)
+        weights_path = MODEL_PATH
+    state_dict = torch.load(weights_path, map_location="cpu", weights_only=True)
+
+    for name in args.engines:
+        print(f"🔧 Building '{name}' engine...")
+        if name == "onnx":
+            reference = engines.export_onnx(state_dict, len(class_names))
+            diff = engines.max_abs_diff(reference, OnnxRunner())
+            if diff > ONNX_TOLERANCE:
+                os.remove(engines.ARTIFACT_PATHS[name])
+                print(f"❌ ERROR: ONNX output differs from PyTorch by {diff:.2e} (> {ONNX_TOLERANCE:.0e}), export removed")
+                continue
+            print(f"✅ Saved {engines.ARTIFACT_PATHS[name]} (max logit diff vs PyTorch {diff:.2e})")
+            publish_artifact(args.version, name)
+            continue
+        elif name == "fused":
+            model = engines.build_fused(state_dict, len(class_names))
+        else:
+            if not os.path.exists(args.calibration_dir):
+                print(f"❌ ERROR: Calibration directory '{args.calibration_dir}' not found")
+                continue
+            model = engines.build_int8(
+                state_dict,
+                len(class_names),
+                calibration_batches(args.calibration_dir, args.calibration_size),
+            )
+
+        torch.jit.save(model, engines.ARTIFACT_PATHS[name])
+        print(f"✅ Saved {engines.ARTIFACT_PATHS[name]}")
+        publish_artifact(args.version, name)
+
+
+if __name__ == "__main__":
+    main()
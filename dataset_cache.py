@@ -0,0 +1,137 @@
+import os
+import json
+import argparse
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import Dataset
+from torchvision import datasets
+from torchvision.transforms import functional as TF
+
+from backend import image_pipeline
+
+# =========================
+# CONFIGURATION
+# =========================
+DATASET_DIR = "dataset/PlantVillage"
+CACHE_DIR = "dataset/cache"
+IMG_SIZE = image_pipeline.IMG_SIZE
+SHARD_SIZE = 4096  # images per .npy shard (~300MB at 160x160)
+
+# Normalize constants shaped for CHW tensors
+_SCALE = torch.from_numpy(image_pipeline._SCALE).view(3, 1, 1)
+_BIAS = torch.from_numpy(image_pipeline._BIAS).view(3, 1, 1)
+
+
+def _decode(path):
+    return np.asarray(image_pipeline.load_image(path, IMG_SIZE), dtype=np.uint8)
+
+
+def build_cache(split_dir, out_dir, shard_size=SHARD_SIZE, workers=None):
+    """Decode and resize every image in an ImageFolder split once.
+
+    Writes uint8 (N, H, W, 3) shards, an int64 label array and index.json.
+    Labels follow ImageFolder's class order so they match train.py.
+    """
+    folder = datasets.ImageFolder(split_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = [path for path, _ in folder.samples]
+    labels = np.array([label for _, label in folder.samples], dtype=np.int64)
+    np.save(os.path.join(out_dir, "labels.npy"), labels)
+
+    shards = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for shard_idx, start in enumerate(range(0, len(paths), shard_size)):
+            chunk = paths[start:start + shard_size]
+            name = f"images_{shard_idx:04d}.npy"
+            shard = np.lib.format.open_memmap(
+                os.path.join(out_dir, name), mode="w+", dtype=np.uint8,
+                shape=(len(chunk), IMG_SIZE[1], IMG_SIZE[0], 3)
+            )
+            for i, pixels in enumerate(pool.map(_decode, chunk)):
+                shard[i] = pixels
+            shard.flush()
+            del shard
+            shards.append({"file": name, "count": len(chunk)})
+            print(f"   {out_dir}: {start + len(chunk)}/{len(paths)} images")
+
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump({"classes": folder.classes, "size": list(IMG_SIZE), "shards": shards}, f, indent=2)
+
+
+def has_cache(cache_dir):
+    return os.path.exists(os.path.join(cache_dir, "index.json"))
+
+
+class CachedImageDataset(Dataset):
+    """Reads a split written by ``build_cache`` straight from memory-mapped shards.
+
+    Shards are mapped copy-on-write, so ``torch.from_numpy`` views them
+    without copying and DataLoader workers share the page cache. With
+    ``augment=True`` the train.py augmentations (rotation +-20 degrees,
+    horizontal flip) are applied to the uint8 tensor before normalization.
+    """
+
+    def __init__(self, cache_dir, augment=False):
+        with open(os.path.join(cache_dir, "index.json")) as f:
+            index = json.load(f)
+
+        self.cache_dir = cache_dir
+        self.classes = index["classes"]
+        self.augment = augment
+        self.files = [s["file"] for s in index["shards"]]
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        self.offsets = np.cumsum([0] + [s["count"] for s in index["shards"]])
+        self._open_shards()
+
+    def _open_shards(self):
+        self.shards = [np.load(os.path.join(self.cache_dir, name), mmap_mode="c") for name in self.files]
+
+    def __getstate__(self):
+        # Pickling a memmap copies its data; spawned DataLoader workers
+        # (Windows/macOS) re-map the shards instead.
+        state = self.__dict__.copy()
+        del state["shards"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open_shards()
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx):
+        shard = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        pixels = torch.from_numpy(self.shards[shard][idx - self.offsets[shard]]).permute(2, 0, 1)
+
+        if self.augment:
+            pixels = TF.rotate(pixels, float(torch.empty(1).uniform_(-20, 20)))
+            if torch.rand(1) < 0.5:
+                pixels = TF.hflip(pixels)
+
+        image = pixels.float() * _SCALE + _BIAS
+        return image, int(self.labels[idx])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-decode the dataset into memory-mapped uint8 shards")
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--splits", nargs="+", default=["train", "val"])
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    for split in args.splits:
+        split_dir = os.path.join(args.dataset_dir, split)
+        if not os.path.exists(split_dir):
+            print(f"❌ ERROR: '{split_dir}' not found")
+            continue
+        print(f"🗜️  Caching {split_dir} -> {os.path.join(args.cache_dir, split)}")
+        build_cache(split_dir, os.path.join(args.cache_dir, split), args.shard_size)
+        print(f"✅ {split} cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,324 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timezone
 import torch
 import numpy as np
-from torchvision import datasets, models, transforms
+from torchvision import datasets
 from torch.utils.data import DataLoader
-from sklearn.metrics import accuracy_score
+
+from backend import engines, image_pipeline, model_registry, model_spec, precision as precision_modes
+from backend.ml_utils import THRESHOLD
+from backend.onnx_engine import OnnxRunner
+from dataset_cache import CachedImageDataset, has_cache
 
 DATASET_DIR = "dataset/PlantVillage/val"
+CACHE_DIR = "dataset/cache/val"  # built by dataset_cache.py; used when present
 MODEL_PATH = "model/plant_disease_model.pth"
 CLASS_PATH = "model/class_indices.npy"
+REPORT_PATH = "model/eval_report.json"
+
+# Rejection threshold the API serves with, always part of the sweep
+SERVING_THRESHOLD = THRESHOLD
+THRESHOLDS = np.union1d(np.round(np.arange(0.05, 1.0, 0.05), 2), [SERVING_THRESHOLD])
+TOP_K = (1, 3, 5)
+ECE_BINS = 15
+TOP_CONFUSIONS = 20
+
+
+def to_tensor(image):
+    return torch.from_numpy(image_pipeline.to_array(image))
+
+
+def load_model(engine, num_classes, device, precision_mode="fp32"):
+    if engine == "eager":
+        model = engines.build_model(num_classes)
+        model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
+        model.to(device)
+        model.eval()
+        if precision_mode == "fp32":
+            return model, device
+
+        precision = precision_modes.resolve(precision_mode, device)
+        model = precision.prepare_model(model)
+
+        def forward(inputs):
+            with precision.autocast(device):
+                return model(precision.prepare_input(inputs)).float()
+        return forward, device
+
+    if engine == "onnx":
+        runner = OnnxRunner()
+        return (lambda inputs: torch.from_numpy(runner(inputs.numpy()))), torch.device("cpu")
+
+    # TorchScript artifacts (fused / int8) are CPU-only
+    return engines.load_engine(engine), torch.device("cpu")
+
+
+class StreamingMetrics:
+    """Evaluation statistics accumulated batch by batch in fixed-size tensors.
+
+    Nothing grows with the dataset: the confusion matrix, top-k hit counts,
+    calibration bins and threshold sweep are all updated in place.
+    """
+
+    def __init__(self, num_classes, top_k=TOP_K, thresholds=THRESHOLDS, ece_bins=ECE_BINS):
+        self.num_classes = num_classes
+        self.top_k = [k for k in top_k if k <= num_classes]
+        self.thresholds = torch.as_tensor(thresholds, dtype=torch.float32)
+        self.ece_bins = ece_bins
+
+        self.confusion = torch.zeros(num_classes * num_classes, dtype=torch.int64)
+        self.topk_hits = torch.zeros(len(self.top_k), dtype=torch.int64)
+        self.bin_count = torch.zeros(ece_bins, dtype=torch.float64)
+        self.bin_confidence = torch.zeros(ece_bins, dtype=torch.float64)
+        self.bin_correct = torch.zeros(ece_bins, dtype=torch.float64)
+        self.accepted = torch.zeros(len(self.thresholds), dtype=torch.int64)
+        self.accepted_correct = torch.zeros(len(self.thresholds), dtype=torch.int64)
+        self.count = 0
+
+    def update(self, logits, labels):
+        """Fold one batch of logits into the running totals; returns top-1 predictions."""
+        probs = torch.softmax(logits.float().cpu(), dim=1)
+        labels = labels.cpu()
+        confidence, preds = probs.max(dim=1)
+        correct = preds == labels
+
+        self.confusion += torch.bincount(labels * self.num_classes + preds, minlength=self.num_classes ** 2)
+
+        # hits[:, j] is True when the label is the (j+1)-th most likely class
+        hits = probs.topk(max(self.top_k), dim=1).indices == labels.unsqueeze(1)
+        cumulative = hits.cumsum(dim=1).sum(dim=0)
+        self.topk_hits += cumulative[[k - 1 for k in self.top_k]]
+
+        bins = (confidence * self.ece_bins).long().clamp_(max=self.ece_bins - 1)
+        self.bin_count += torch.bincount(bins, minlength=self.ece_bins)
+        self.bin_confidence += torch.bincount(bins, weights=confidence.double(), minlength=self.ece_bins)
+        self.bin_correct += torch.bincount(bins, weights=correct.double(), minlength=self.ece_bins)
+
+        accepted = confidence.unsqueeze(1) >= self.thresholds
+        self.accepted += accepted.sum(dim=0)
+        self.accepted_correct += (accepted & correct.unsqueeze(1)).sum(dim=0)
+
+        self.count += len(labels)
+        return preds
+
+    def report(self, class_names):
+        n = max(self.count, 1)
+        confusion = self.confusion.view(self.num_classes, self.num_classes).numpy()
+        true_positives = np.diag(confusion)
+        support = confusion.sum(axis=1)
+        predicted = confusion.sum(axis=0)
+        precision = np.divide(true_positives, predicted, out=np.zeros(len(support)), where=predicted > 0)
+        recall = np.divide(true_positives, support, out=np.zeros(len(support)), where=support > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall,
+                       out=np.zeros(len(support)), where=(precision + recall) > 0)
+        present = support > 0
+
+        # Expected calibration error: |accuracy - confidence| per bin, weighted by bin size
+        gap = (self.bin_correct - self.bin_confidence).abs()
+        ece = float(gap.sum() / n)
+
+        off_diagonal = confusion.copy()
+        np.fill_diagonal(off_diagonal, 0)
+        top_pairs = np.argsort(off_diagonal, axis=None)[::-1][:TOP_CONFUSIONS]
+        confusions = [
+            {"true": str(class_names[i]), "predicted": str(class_names[j]), "count": int(off_diagonal[i, j])}
+            for i, j in zip(*np.unravel_index(top_pairs, off_diagonal.shape)) if off_diagonal[i, j] > 0
+        ]
+
+        sweep = []
+        for threshold, accepted, accepted_correct in zip(self.thresholds.tolist(), self.accepted.tolist(), self.accepted_correct.tolist()):
+            sweep.append({
+                "threshold": round(threshold, 4),
+                "coverage": accepted / n,  # share of images the API would answer
+                "accepted_accuracy": accepted_correct / accepted if accepted else None,
+                "rejected": self.count - accepted,
+            })
+
+        return {
+            "images": self.count,
+            "accuracy": float(true_positives.sum() / n),
+            "top_k_accuracy": {f"top{k}": hits / n for k, hits in zip(self.top_k, self.topk_hits.tolist())},
+            "macro_precision": float(precision[present].mean()) if present.any() else 0.0,
+            "macro_recall": float(recall[present].mean()) if present.any() else 0.0,
+            "ece": ece,
+            "calibration_bins": [
+                {"upper": (i + 1) / self.ece_bins, "count": int(count),
+                 "confidence": confidence / count, "accuracy": correct / count}
+                for i, (count, confidence, correct) in enumerate(zip(
+                    self.bin_count.tolist(), self.bin_confidence.tolist(), self.bin_correct.tolist()))
+                if count
+            ],
+            "per_class": {
+                str(name): {"precision": float(precision[i]), "recall": float(recall[i]),
+                            "f1": float(f1[i]), "support": int(support[i])}
+                for i, name in enumerate(class_names)
+            },
+            "top_confusions": confusions,
+            "threshold_sweep": sweep,
+        }
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def evaluate(model, device, loader, metrics, predictions=None):
+    """Stream ``loader`` through ``model`` into ``metrics``.
+
+    Top-1 predictions are written into the preallocated ``predictions`` array
+    when one is given (used for agreement between engines).
+    """
+    batch_ms = np.empty(len(loader))
+    offset = 0
+    start_all = time.perf_counter()
+
+    with torch.no_grad():
+        for i, (inputs, labels) in enumerate(loader):
+            inputs = inputs.to(device)
+            start = time.perf_counter()
+            outputs = model(inputs)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            batch_ms[i] = (time.perf_counter() - start) * 1000
+
+            preds = metrics.update(outputs, labels)
+            if predictions is not None:
+                predictions[offset:offset + len(preds)] = preds.numpy()
+            offset += len(preds)
+
+    wall = time.perf_counter() - start_all
+    return {
+        "images_per_sec": offset / max(batch_ms.sum() / 1000, 1e-9),  # forward passes only
+        "end_to_end_images_per_sec": offset / max(wall, 1e-9),  # including data loading
+        "batch_latency_ms": percentiles(batch_ms),
+    }
+
+
+def measure_latency(model, device, dataset, samples=50, warmup=5):
+    """Single-image forward latency, which is what one API request pays."""
+    latencies = np.empty(samples)
+    with torch.no_grad():
+        for i in range(warmup + samples):
+            image, _ = dataset[i % len(dataset)]
+            image = image.unsqueeze(0).to(device)
+            start = time.perf_counter()
+            model(image)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            if i >= warmup:
+                latencies[i - warmup] = (time.perf_counter() - start) * 1000
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report accuracy, calibration and latency for each inference engine")
+    parser.add_argument("--engines", nargs="+", default=list(engines.ENGINES), choices=engines.ENGINES)
+    parser.add_argument("--data-dir", default=DATASET_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--precisions", nargs="+", default=["fp32"], choices=precision_modes.MODES,
+                        help="eager-engine precisions to compare against fp32")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto",
+                        help="device for the eager engine (other engines are CPU-only)")
+    parser.add_argument("--report", default=REPORT_PATH, help="where to write the JSON report")
+    parser.add_argument("--max-accuracy-drop", type=float, default=1.0,
+                        help="accuracy budget vs eager, in percentage points")
+    args = parser.parse_args()
+
+    if args.device == "auto":
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    else:
+        device = torch.device(args.device)
+
+    # Load classes; the weights must have been trained for the API's preprocessing
+    class_names = np.load(CLASS_PATH, allow_pickle=True)
+    model_spec.check(model_spec.load(MODEL_PATH), MODEL_PATH)
+
+    if has_cache(args.cache_dir):
+        # Pre-decoded shards written with the same decode/resize path
+        print(f"🗜️  Using pre-decoded dataset cache in {args.cache_dir}")
+        dataset = CachedImageDataset(args.cache_dir)
+        source = args.cache_dir
+    else:
+        # Same decode/resize/normalize path as the API
+        dataset = datasets.ImageFolder(args.data_dir, transform=to_tensor, loader=image_pipeline.load_image)
+        source = args.data_dir
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.workers)
+
+    # Eager runs once per requested precision; fp32 eager is the parity reference
+    runs = []
+    for engine in args.engines:
+        if engine == "eager":
+            precisions = ["fp32"] + [p for p in args.precisions if p != "fp32"]
+            runs.extend(("eager" if p == "fp32" else f"eager/{p}", engine, p) for p in precisions)
+        else:
+            runs.append((engine, engine, "fp32"))
+
+    results = {}
+    reference = None
+    for name, engine, precision_mode in runs:
+        if engine != "eager" and not os.path.exists(engines.ARTIFACT_PATHS[engine]):
+            print(f"⚠️ Skipping '{engine}': {engines.ARTIFACT_PATHS[engine]} not found (run build_engines.py)")
+            continue
 
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model, run_device = load_model(engine, len(class_names), device, precision_mode)
+        metrics = StreamingMetrics(len(class_names))
+        predictions = np.empty(len(dataset), dtype=np.int64)
+        timing = evaluate(model, run_device, loader, metrics, predictions)
+        timing["latency_ms"] = measure_latency(model, run_device, dataset)
 
-# Load classes
-class_names = np.load(CLASS_PATH, allow_pickle=True)
+        result = metrics.report(class_names)
+        result["device"] = str(run_device)
+        result["throughput"] = timing
+        if engine != "eager":
+            result["artifact_version"] = model_registry.file_digest(engines.ARTIFACT_PATHS[engine])
+        results[name] = result
 
-# Model
-model = models.mobilenet_v2(weights=None)
-model.classifier[1] = torch.nn.Linear(model.last_channel, len(class_names))
-model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-model.to(DEVICE)
-model.eval()
+        parity = ""
+        if name == "eager":
+            reference = predictions
+        elif reference is not None:
+            # Fraction of images whose top-1 class matches fp32 eager
+            result["agreement"] = float(np.mean(predictions == reference))
+            parity = f" | {result['agreement'] * 100:.2f}% agree with eager"
 
-# Transform
-transform = transforms.Compose([
-    transforms.Resize((160, 160)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
-])
+        accuracy, latency = result["accuracy"], timing["latency_ms"]
+        top_k = " ".join(f"{k} {v * 100:.1f}%" for k, v in result["top_k_accuracy"].items())
+        print(f"✅ {name:>6}: Accuracy {accuracy * 100:.2f}% ({top_k}) | ECE {result['ece']:.3f} | "
+              f"{timing['images_per_sec']:.1f} img/s (batch {args.batch_size}) | "
+              f"latency p50 {latency['p50']:.1f}ms p95 {latency['p95']:.1f}ms p99 {latency['p99']:.1f}ms{parity}")
 
-dataset = datasets.ImageFolder(DATASET_DIR, transform=transform)
-loader = DataLoader(dataset, batch_size=32, shuffle=False)
+        served = next(s for s in result["threshold_sweep"] if s["threshold"] == round(SERVING_THRESHOLD, 4))
+        if served["accepted_accuracy"] is not None:
+            print(f"   At threshold {SERVING_THRESHOLD:.2f}: {served['coverage'] * 100:.1f}% answered, "
+                  f"{served['accepted_accuracy'] * 100:.2f}% of those correct")
 
-y_true, y_pred = [], []
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model_version": model_registry.file_digest(MODEL_PATH) if os.path.exists(MODEL_PATH) else None,
+        "dataset": source,
+        "batch_size": args.batch_size,
+        "serving_threshold": SERVING_THRESHOLD,
+        "classes": [str(name) for name in class_names],
+        "engines": results,
+    }
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"📄 Report written to {args.report}")
 
-with torch.no_grad():
-    for inputs, labels in loader:
-        inputs, labels = inputs.to(DEVICE), labels.to(DEVICE)
-        outputs = model(inputs)
-        _, preds = torch.max(outputs, 1)
+    # Pick the fastest single-image engine that stays within the accuracy budget
+    if "eager" in results:
+        floor = results["eager"]["accuracy"] - args.max_accuracy_drop / 100
+        eligible = [name for name, r in results.items() if r["accuracy"] >= floor]
+        best = min(eligible, key=lambda name: results[name]["throughput"]["latency_ms"]["p50"])
+        print(f"🏁 Fastest engine within {args.max_accuracy_drop:.1f}pt of eager: {best}")
 
-        y_true.extend(labels.cpu().numpy())
-        y_pred.extend(preds.cpu().numpy())
 
-acc = accuracy_score(y_true, y_pred)
-print(f"✅ Validation Accuracy: {acc * 100:.2f}%")
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import { Trash2, Calendar } from 'lucide-react';
 const History = () => {
     const [history, setHistory] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const handleDelete = async (id) => {
         if (!confirm("Are you sure you want to delete this record?")) return;
@@ -22,14 +24,32 @@ const History = () => {
         }
     };
 
+    const fetchPage = async (cursor) => {
+        const token = localStorage.getItem("token");
+        const res = await axios.get(`${import.meta.env.VITE_API_URL}/api/history`, {
+            headers: { Authorization: `Bearer ${token}` },
+            params: cursor ? { cursor } : {}
+        });
+        setNextCursor(res.data.next_cursor);
+        return res.data.items;
+    };
+
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const items = await fetchPage(nextCursor);
+            setHistory(prev => [...prev, ...items]);
+        } catch (error) {
+            console.error("Failed to fetch history", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         const fetchHistory = async () => {
             try {
-                const token = localStorage.getItem("token");
-                const res = await axios.get(`${import.meta.env.VITE_API_URL}/api/history`, {
-                    headers: { Authorization: `Bearer ${token}` }
-                });
-                setHistory(res.data);
+                setHistory(await fetchPage(null));
             } catch (error) {
                 console.error("Failed to fetch history", error);
             } finally {
@@ -70,11 +90,16 @@ const History = () => {
                                         {new Date(item.created_at).toLocaleDateString()}
                                     </td>
                                     <td style={{ padding: '15px' }}>
-                                        <img
-                                            src={`${import.meta.env.VITE_API_URL}/uploads/${item.image_path}`}
-                                            alt="Thumbnail"
-                                            style={{ width: '50px', height: '50px', objectFit: 'cover', borderRadius: '8px' }}
-                                        />
+                                        <a href={`${import.meta.env.VITE_API_URL}${item.medium_url}`} target="_blank" rel="noreferrer">
+                                            <img
+                                                src={`${import.meta.env.VITE_API_URL}${item.thumbnail_url}`}
+                                                alt="Thumbnail"
+                                                loading="lazy"
+                                                width="50"
+                                                height="50"
+                                                style={{ width: '50px', height: '50px', objectFit: 'cover', borderRadius: '8px' }}
+                                            />
+                                        </a>
                                     </td>
                                     <td style={{ padding: '15px', fontWeight: '500', color: '#2D3748' }}>{item.prediction}</td>
                                     <td style={{ padding: '15px', color: '#4A5568' }}>
@@ -110,6 +135,13 @@ const History = () => {
                             ))}
                         </tbody>
                     </table>
+                    {nextCursor && (
+                        <div style={{ padding: '15px', textAlign: 'center' }}>
+                            <button onClick={loadMore} disabled={loadingMore} className="btn btn-primary">
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
         </div>
@@ -0,0 +1,42 @@
+import os
+import sys
+import multiprocessing
+
+# Usage: gunicorn -c gunicorn.conf.py backend.app:app
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Import the app once in the master before forking. The model itself is
+# loaded and warmed up inside each worker (see post_worker_init); with
+# MODEL_MMAP the workers still share one copy of the weights through the
+# page cache.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of every worker spawning a
+    # full-size intra-op thread pool. torch is normally imported later, by
+    # the worker's model loader, and then picks up OMP_NUM_THREADS; the ONNX
+    # engine reads ONNX_THREADS instead.
+    threads_per_worker = max(1, multiprocessing.cpu_count() // workers)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads_per_worker)
+    else:
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+
+    if preload_app:
+        # Connections opened by the master must not be shared with children.
+        from backend.app import app, db
+
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Load and warm up the model in the background; /readyz reports when done.
+    from backend.app import start_worker
+
+    start_worker()
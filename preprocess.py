@@ -4,9 +4,11 @@ from torchvision import datasets, transforms
 import matplotlib.pyplot as plt
 import numpy as np
 
+from backend import model_spec
+
 # Configuration
 DATASET_DIR = 'dataset/PlantVillage'
-IMG_SIZE = (224, 224)
+IMG_SIZE = model_spec.INPUT_SIZE  # what the model is trained and served at
 
 def check_data():
     if not os.path.exists(DATASET_DIR):
@@ -0,0 +1,152 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from backend import lifecycle
+from backend.lifecycle import UploadReclaimer
+from backend.models import db, User, Prediction, PredictionJob
+from backend.storage import LocalStorage
+from backend import thumbnails
+
+OLD = time.time() - 2 * 3600 # outside the default one hour grace period
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@b.c", password_hash="x"))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path / "uploads"))
+
+
+@pytest.fixture
+def reclaimer(app, storage):
+    return UploadReclaimer(app, storage, interval_seconds=0, grace_seconds=3600)
+
+
+def upload(storage, name, mtime=OLD, legacy=False):
+    """Write an original and its derivatives, dated ``mtime``."""
+    names = [name] + [thumbnails.derivative_name(name, size) for size in thumbnails.SIZES]
+    for i, file in enumerate(names):
+        if legacy and i == 0:
+            os.makedirs(storage.root, exist_ok=True)
+            path = os.path.join(storage.root, file)
+            with open(path, "wb") as f:
+                f.write(b"x")
+        else:
+            path = storage.save(file, b"x")
+        os.utime(path, (mtime, mtime))
+    return names
+
+
+def predict(name, created_at=None):
+    db.session.add(Prediction(user_id=1, image_path=name, prediction="Tomato___healthy", confidence=99.0,
+                              created_at=created_at or datetime.utcnow()))
+    db.session.commit()
+
+
+def job(name, status, updated_at=None):
+    updated_at = updated_at or datetime.utcnow()
+    db.session.add(PredictionJob(id=name.split('.')[0].ljust(32, '0'), user_id=1, image_path=name, status=status,
+                                 created_at=updated_at, updated_at=updated_at))
+    db.session.commit()
+
+
+def test_orphans_are_deleted_with_their_derivatives(reclaimer, storage):
+    names = upload(storage, "aaaa1111.jpg")
+    stats = reclaimer.run_once()
+    assert stats["orphan"] == len(names)
+    assert not any(storage.exists(name) for name in names)
+
+
+def test_referenced_uploads_are_kept(reclaimer, storage):
+    names = upload(storage, "bbbb2222.jpg")
+    predict("bbbb2222.jpg")
+    assert reclaimer.run_once()["orphan"] == 0
+    assert all(storage.exists(name) for name in names)
+
+
+def test_grace_period_protects_new_uploads(reclaimer, storage):
+    names = upload(storage, "cccc3333.jpg", mtime=time.time())
+    assert reclaimer.run_once()["orphan"] == 0
+    assert all(storage.exists(name) for name in names)
+
+
+def test_pending_jobs_keep_their_upload(reclaimer, storage):
+    names = upload(storage, "dddd4444.jpg")
+    job("dddd4444.jpg", "queued")
+    assert reclaimer.run_once()["orphan"] == 0
+    assert all(storage.exists(name) for name in names)
+
+    db.session.get(PredictionJob, "dddd4444".ljust(32, '0')).status = "done"
+    db.session.commit()
+    assert reclaimer.run_once()["orphan"] == len(names)
+
+
+def test_stale_jobs_are_failed_and_stop_keeping_files(app, storage):
+    reclaimer = UploadReclaimer(app, storage, interval_seconds=0, grace_seconds=3600, stale_job_seconds=600)
+    names = upload(storage, "eeee5555.jpg")
+    job("eeee5555.jpg", "running", updated_at=datetime.utcnow() - timedelta(hours=1))
+    stats = reclaimer.run_once()
+    assert stats["stale_jobs"] == 1
+    assert stats["orphan"] == len(names)
+    assert db.session.get(PredictionJob, "eeee5555".ljust(32, '0')).status == "failed"
+
+
+def test_retention_removes_images_of_old_predictions_only(app, storage):
+    reclaimer = UploadReclaimer(app, storage, interval_seconds=0, grace_seconds=3600, retention_days=30)
+    old_names = upload(storage, "ffff6666.jpg")
+    new_names = upload(storage, "abab7777.jpg")
+    predict("ffff6666.jpg", created_at=datetime.utcnow() - timedelta(days=60))
+    predict("abab7777.jpg", created_at=datetime.utcnow() - timedelta(days=1))
+
+    stats = reclaimer.run_once()
+    assert stats["retention"] == len(old_names)
+    assert not any(storage.exists(name) for name in old_names)
+    assert all(storage.exists(name) for name in new_names)
+    assert Prediction.query.count() == 2 # the history rows stay
+
+
+def test_dry_run_keeps_legacy_originals_with_their_derivatives(reclaimer, storage, monkeypatch):
+    # Pre-sharding original in the flat folder, derivatives already sharded,
+    # with batches small enough that each shard is checked on its own
+    monkeypatch.setattr(lifecycle, "QUERY_BATCH", 2)
+    names = upload(storage, "cdcd8888.jpg", legacy=True)
+    predict("cdcd8888.jpg")
+    orphans = upload(storage, "efef9999.jpg", legacy=True)
+
+    stats = reclaimer.run_once(dry_run=True)
+    assert (stats["orphan"], stats["migrated"]) == (len(orphans), 0)
+    assert all(storage.exists(name) for name in names + orphans)
+
+    stats = reclaimer.run_once()
+    assert (stats["orphan"], stats["migrated"]) == (len(orphans), 2)
+    assert all(storage.exists(name) for name in names)
+    assert os.path.dirname(storage.path("cdcd8888.jpg")) == os.path.join(storage.root, "cd", "cd")
+
+
+def test_release_applies_the_same_rules(reclaimer, storage):
+    names = upload(storage, "1234abcd.jpg")
+    job("1234abcd.jpg", "queued")
+    assert reclaimer.release("1234abcd.jpg") == 0
+
+    db.session.get(PredictionJob, "1234abcd".ljust(32, '0')).status = "failed"
+    db.session.commit()
+    storage.save("1234abcd.jpg", b"x") # re-upload of the same bytes restarts the grace period
+    assert reclaimer.release("1234abcd.jpg") == 0
+
+    os.utime(storage.path("1234abcd.jpg"), (OLD, OLD))
+    assert reclaimer.release("1234abcd.jpg") == len(names)
+    assert not any(storage.exists(name) for name in names)
@@ -1,46 +1,64 @@
 import os
 import copy
+import argparse
 import time
+import uuid
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torchvision import datasets, models, transforms
+from torchvision import datasets, transforms
 from torch.utils.data import DataLoader
 import matplotlib.pyplot as plt
 import numpy as np
 
+from backend import engines, model_registry, model_spec, precision as precision_modes
+from dataset_cache import CachedImageDataset, has_cache
+
 # =========================
 # CONFIGURATION
 # =========================
 DATASET_DIR = "dataset/PlantVillage"
-IMG_SIZE = (160,160)
+CACHE_DIR = "dataset/cache"  # built by dataset_cache.py; used when present
+IMG_SIZE = model_spec.INPUT_SIZE  # shared with the API, see backend/model_spec.py
 BATCH_SIZE = 32
 EPOCHS = 25
 
 LEARNING_RATE = 1e-4
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-MODEL_DIR = "model"
-MODEL_PATH = os.path.join(MODEL_DIR, "plant_disease_model.pth")
-CLASS_PATH = os.path.join(MODEL_DIR, "class_indices.npy")
+# fp32 | channels_last | bf16 | bf16+channels_last (see backend/precision.py).
+# bf16 autocast only kicks in when the CPU/GPU has native bf16 kernels.
+PRECISION = "fp32"
 
-# =========================
-# TRAIN FUNCTION
-# =========================
-def train_model():
-    print(f"Using device: {DEVICE}")
+# Data loading: decode/augment in worker processes so the training step never
+# waits on the same core. Pinned memory only helps host -> GPU copies.
+NUM_WORKERS = os.cpu_count() or 0
+PREFETCH_FACTOR = 4  # batches queued ahead per worker
+PERSISTENT_WORKERS = True  # keep workers alive between epochs
+PIN_MEMORY = DEVICE.type == "cuda"
 
-    # Check dataset structure
-    train_dir = os.path.join(DATASET_DIR, "train")
-    val_dir = os.path.join(DATASET_DIR, "val")
+# Head-only mode: pooled backbone features are computed once and cached here.
+# Delete the directory after changing the dataset to recompute them.
+FEATURE_DIR = os.path.join(CACHE_DIR, "features")
+FEATURE_VIEWS = 3  # augmented passes over the train set to cache
 
-    if not os.path.exists(train_dir) or not os.path.exists(val_dir):
-        print("❌ ERROR: Dataset must contain 'train' and 'val' folders")
-        return
+MODEL_DIR = "model"
+MODEL_PATH = os.path.join(MODEL_DIR, "plant_disease_model.pth")
+CLASS_PATH = os.path.join(MODEL_DIR, "class_indices.npy")
 
-    # Create model directory
-    os.makedirs(MODEL_DIR, exist_ok=True)
+def make_loader(dataset, shuffle):
+    workers = NUM_WORKERS > 0
+    return DataLoader(
+        dataset,
+        batch_size=BATCH_SIZE,
+        shuffle=shuffle,
+        num_workers=NUM_WORKERS,
+        pin_memory=PIN_MEMORY,
+        persistent_workers=PERSISTENT_WORKERS and workers,
+        prefetch_factor=PREFETCH_FACTOR if workers else None,
+    )
 
+def load_datasets(train_dir, val_dir):
     # =========================
     # DATA TRANSFORMS
     # =========================
@@ -50,33 +68,117 @@ def train_model():
             transforms.RandomRotation(20),
             transforms.RandomHorizontalFlip(),
             transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
-            )
+            transforms.Normalize(mean=model_spec.MEAN, std=model_spec.STD)
         ]),
         "val": transforms.Compose([
             transforms.Resize(IMG_SIZE),
             transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
-            )
+            transforms.Normalize(mean=model_spec.MEAN, std=model_spec.STD)
         ]),
     }
 
     # =========================
-    # DATASETS & LOADERS
+    # DATASETS
     # =========================
-    image_datasets = {
-        "train": datasets.ImageFolder(train_dir, data_transforms["train"]),
-        "val": datasets.ImageFolder(val_dir, data_transforms["val"]),
-    }
+    if all(has_cache(os.path.join(CACHE_DIR, x)) for x in ["train", "val"]):
+        # Pre-decoded uint8 shards: no JPEG decode or resize per epoch
+        print(f"🗜️  Using pre-decoded dataset cache in {CACHE_DIR}")
+        image_datasets = {
+            "train": CachedImageDataset(os.path.join(CACHE_DIR, "train"), augment=True),
+            "val": CachedImageDataset(os.path.join(CACHE_DIR, "val")),
+        }
+    else:
+        image_datasets = {
+            "train": datasets.ImageFolder(train_dir, data_transforms["train"]),
+            "val": datasets.ImageFolder(val_dir, data_transforms["val"]),
+        }
+
+    return image_datasets
+
+def build_model(num_classes):
+    # ImageNet backbone, classifier replaced (same network the API loads)
+    return engines.build_model(num_classes, pretrained=True)
+
+def save_weights(state_dict, path):
+    """Write to a temporary file and rename it over ``path``.
+
+    The API memory-maps the weights (MODEL_MMAP); overwriting the file in
+    place would crash a running worker with SIGBUS on its next forward pass.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, path)
+
+def extract_features(backbone, dataset, path, precision):
+    """Pooled 1280-d backbone features for every image in ``dataset``, cached at ``path``."""
+    if os.path.exists(path):
+        cached = np.load(path)
+        if len(cached["labels"]) == len(dataset):
+            print(f"🗜️  Loaded cached features {path}")
+            return torch.from_numpy(cached["features"]), torch.from_numpy(cached["labels"])
+
+    features, labels = [], []
+    with torch.inference_mode(), precision.autocast(DEVICE):
+        for inputs, targets in make_loader(dataset, shuffle=False):
+            outputs = backbone(precision.prepare_input(inputs.to(DEVICE, non_blocking=PIN_MEMORY)))
+            # Same pooling as MobileNetV2.forward, right before the classifier
+            features.append(torch.flatten(nn.functional.adaptive_avg_pool2d(outputs, 1), 1).float().cpu())
+            labels.append(targets)
+
+    features, labels = torch.cat(features), torch.cat(labels)
+    np.savez(path, features=features.numpy(), labels=labels.numpy())
+    print(f"💾 Cached {len(labels)} features to {path}")
+    return features, labels
+
+def publish_model(metrics, activate):
+    """Register the saved weights as a new model version (workers hot-swap to it if activated)."""
+    manifest = model_registry.publish(MODEL_PATH, CLASS_PATH, model_spec.DEFAULT, metrics=metrics, activate_version=activate)
+    state = "active" if activate else "not activated; run python -m backend.model_registry activate " + manifest["version"]
+    print(f"📦 Published model version {manifest['version']} ({state})")
+
+def plot_history(history):
+    plt.figure(figsize=(12, 4))
 
-    dataloaders = {
-        x: DataLoader(image_datasets[x], batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
-        for x in ["train", "val"]
-    }
+    plt.subplot(1, 2, 1)
+    plt.plot(history["train_acc"], label="Train Acc")
+    plt.plot(history["val_acc"], label="Val Acc")
+    plt.title("Accuracy")
+    plt.legend()
+
+    plt.subplot(1, 2, 2)
+    plt.plot(history["train_loss"], label="Train Loss")
+    plt.plot(history["val_loss"], label="Val Loss")
+    plt.title("Loss")
+    plt.legend()
+
+    plt.savefig(os.path.join(MODEL_DIR, "training_history.png"))
+    print("📊 Training history saved")
+
+    plt.close()
+
+# =========================
+# TRAIN FUNCTION
+# =========================
+def train_model(precision_mode=PRECISION, activate=True):
+    print(f"Using device: {DEVICE}")
+    precision = precision_modes.resolve(precision_mode, DEVICE)
+    print(f"Precision: {precision.name}")
+
+    # Check dataset structure
+    train_dir = os.path.join(DATASET_DIR, "train")
+    val_dir = os.path.join(DATASET_DIR, "val")
+
+    if not os.path.exists(train_dir) or not os.path.exists(val_dir):
+        print("❌ ERROR: Dataset must contain 'train' and 'val' folders")
+        return
+
+    # Create model directory
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    image_datasets = load_datasets(train_dir, val_dir)
+
+    dataloaders = {x: make_loader(image_datasets[x], shuffle=True) for x in ["train", "val"]}
+    print(f"Data loading: {NUM_WORKERS} workers, prefetch {PREFETCH_FACTOR}, pin_memory={PIN_MEMORY}")
 
     dataset_sizes = {x: len(image_datasets[x]) for x in ["train", "val"]}
     class_names = image_datasets["train"].classes
@@ -90,20 +192,13 @@ def train_model():
     # =========================
     # MODEL (MobileNetV2)
     # =========================
-    model = models.mobilenet_v2(
-        weights=models.MobileNet_V2_Weights.IMAGENET1K_V1
-    )
+    model = build_model(len(class_names))
 
     # Allow all parameters to train (Finetuning)
     for param in model.parameters():
         param.requires_grad = True
 
-    # Replace classifier
-    model.classifier[1] = nn.Linear(
-        model.last_channel, len(class_names)
-    )
-
-    model = model.to(DEVICE)
+    model = precision.prepare_model(model.to(DEVICE))
 
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.classifier.parameters(), lr=LEARNING_RATE)
@@ -134,14 +229,21 @@ def train_model():
 
             running_loss = 0.0
             running_corrects = 0
+            data_time = 0.0
+            compute_time = 0.0
 
+            end = time.perf_counter()
             for inputs, labels in dataloaders[phase]:
-                inputs = inputs.to(DEVICE)
-                labels = labels.to(DEVICE)
+                fetched = time.perf_counter()
+                data_time += fetched - end
+
+                inputs = precision.prepare_input(inputs.to(DEVICE, non_blocking=PIN_MEMORY))
+                labels = labels.to(DEVICE, non_blocking=PIN_MEMORY)
 
                 optimizer.zero_grad()
 
-                with torch.set_grad_enabled(phase == "train"):
+                # Weights and gradients stay fp32; autocast only lowers the matmuls/convs
+                with torch.set_grad_enabled(phase == "train"), precision.autocast(DEVICE):
                     outputs = model(inputs)
                     _, preds = torch.max(outputs, 1)
                     loss = criterion(outputs, labels)
@@ -150,9 +252,13 @@ def train_model():
                         loss.backward()
                         optimizer.step()
 
+                # loss.item() synchronizes, so compute time includes the device work
                 running_loss += loss.item() * inputs.size(0)
                 running_corrects += torch.sum(preds == labels.data)
 
+                end = time.perf_counter()
+                compute_time += end - fetched
+
             epoch_loss = running_loss / dataset_sizes[phase]
             epoch_acc = running_corrects.double() / dataset_sizes[phase]
 
@@ -160,13 +266,15 @@ def train_model():
             history[f"{phase}_acc"].append(epoch_acc.item())
 
             print(f"{phase.upper()} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}")
+            waiting = data_time / max(data_time + compute_time, 1e-9)
+            print(f"{phase.upper()} Data wait: {data_time:.1f}s Compute: {compute_time:.1f}s ({waiting:.0%} waiting on data)")
 
             if phase == "val" and epoch_acc > best_acc:
                 best_acc = epoch_acc
                 best_model_wts = copy.deepcopy(model.state_dict())
 
                 # save best model immediately
-                torch.save(model.state_dict(), MODEL_PATH)
+                save_weights(model.state_dict(), MODEL_PATH)
                 print("💾 Best model saved:", MODEL_PATH)
 
 
@@ -181,33 +289,147 @@ def train_model():
     model.load_state_dict(best_model_wts)
 
     # Save model
-    torch.save(model.state_dict(), MODEL_PATH)
+    save_weights(model.state_dict(), MODEL_PATH)
+    model_spec.save(MODEL_PATH)
     print(f"✅ Model saved to {MODEL_PATH}")
 
-    # =========================
-    # PLOT TRAINING HISTORY
-    # =========================
-    plt.figure(figsize=(12, 4))
+    plot_history(history)
+    publish_model({"val_acc": float(best_acc), "epochs": EPOCHS, "mode": "full", "precision": precision.name}, activate)
 
-    plt.subplot(1, 2, 1)
-    plt.plot(history["train_acc"], label="Train Acc")
-    plt.plot(history["val_acc"], label="Val Acc")
-    plt.title("Accuracy")
-    plt.legend()
+# =========================
+# HEAD-ONLY TRAINING
+# =========================
+def train_head(views=FEATURE_VIEWS, precision_mode=PRECISION, activate=True):
+    """Train only the classifier on cached backbone features.
 
-    plt.subplot(1, 2, 2)
-    plt.plot(history["train_loss"], label="Train Loss")
-    plt.plot(history["val_loss"], label="Val Loss")
-    plt.title("Loss")
-    plt.legend()
+    The backbone runs once per cached view instead of once per epoch; every
+    epoch then trains the Dropout + Linear head on a randomly chosen view of
+    each image. The saved state dict has the same format as train_model().
+    """
+    print(f"Using device: {DEVICE}")
+    precision = precision_modes.resolve(precision_mode, DEVICE)
+    print(f"Precision: {precision.name}")
 
-    plt.savefig(os.path.join(MODEL_DIR, "training_history.png"))
-    print("📊 Training history saved")
+    train_dir = os.path.join(DATASET_DIR, "train")
+    val_dir = os.path.join(DATASET_DIR, "val")
 
-    plt.close()
+    if not os.path.exists(train_dir) or not os.path.exists(val_dir):
+        print("❌ ERROR: Dataset must contain 'train' and 'val' folders")
+        return
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    os.makedirs(FEATURE_DIR, exist_ok=True)
+
+    image_datasets = load_datasets(train_dir, val_dir)
+    class_names = image_datasets["train"].classes
+    np.save(CLASS_PATH, class_names)
+
+    # The backbone stays in eval mode, so BatchNorm keeps its ImageNet statistics
+    model = precision.prepare_model(build_model(len(class_names)).to(DEVICE))
+    model.eval()
+
+    since = time.time()
+    # bf16 features differ slightly from fp32 ones, so they are cached separately
+    size = f"{IMG_SIZE[0]}x{IMG_SIZE[1]}"
+    if precision.bf16:
+        size += "_bf16"
+    train_views = [
+        extract_features(model.features, image_datasets["train"], os.path.join(FEATURE_DIR, f"train_{size}_view{v}.npz"), precision)
+        for v in range(views)
+    ]
+    train_features = torch.stack([features for features, _ in train_views])  # (views, N, 1280)
+    train_labels = train_views[0][1]  # loader is unshuffled, so labels match across views
+    val_features, val_labels = extract_features(model.features, image_datasets["val"], os.path.join(FEATURE_DIR, f"val_{size}.npz"), precision)
+    print(f"Features ready in {time.time() - since:.0f}s")
+
+    head = model.classifier
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=LEARNING_RATE)
+
+    best_acc = 0.0
+    best_head_wts = copy.deepcopy(head.state_dict())
+    history = {"train_loss": [], "train_acc": [], "val_loss": [], "val_acc": []}
+
+    for epoch in range(EPOCHS):
+        print(f"\nEpoch {epoch + 1}/{EPOCHS}")
+        print("-" * 30)
+
+        # Random view per image and random order each epoch
+        n = len(train_labels)
+        order = torch.randperm(n)
+        view = torch.randint(views, (n,))
+        splits = {
+            "train": (train_features[view[order], order], train_labels[order]),
+            "val": (val_features, val_labels),
+        }
+
+        for phase in ["train", "val"]:
+            head.train(phase == "train")
+            features, labels = splits[phase]
+            running_loss = 0.0
+            running_corrects = 0
+
+            for i in range(0, len(labels), BATCH_SIZE):
+                inputs = features[i:i + BATCH_SIZE].to(DEVICE)
+                targets = labels[i:i + BATCH_SIZE].to(DEVICE)
+
+                optimizer.zero_grad()
+
+                with torch.set_grad_enabled(phase == "train"):
+                    outputs = head(inputs)
+                    _, preds = torch.max(outputs, 1)
+                    loss = criterion(outputs, targets)
+
+                    if phase == "train":
+                        loss.backward()
+                        optimizer.step()
+
+                running_loss += loss.item() * inputs.size(0)
+                running_corrects += torch.sum(preds == targets).item()
+
+            epoch_loss = running_loss / len(labels)
+            epoch_acc = running_corrects / len(labels)
+            history[f"{phase}_loss"].append(epoch_loss)
+            history[f"{phase}_acc"].append(epoch_acc)
+
+            print(f"{phase.upper()} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}")
+
+            if phase == "val" and epoch_acc > best_acc:
+                best_acc = epoch_acc
+                best_head_wts = copy.deepcopy(head.state_dict())
+
+                # save best model immediately (full network, same format as train_model)
+                save_weights(model.state_dict(), MODEL_PATH)
+                print("💾 Best model saved:", MODEL_PATH)
+
+    time_elapsed = time.time() - since
+    print(f"\nTraining complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s")
+    print(f"Best Validation Accuracy: {best_acc:.4f}")
+
+    head.load_state_dict(best_head_wts)
+    save_weights(model.state_dict(), MODEL_PATH)
+    model_spec.save(MODEL_PATH)
+    print(f"✅ Model saved to {MODEL_PATH}")
+
+    plot_history(history)
+    publish_model({"val_acc": float(best_acc), "epochs": EPOCHS, "mode": "head", "views": views, "precision": precision.name}, activate)
 
 # =========================
 # MAIN
 # =========================
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the plant disease classifier")
+    parser.add_argument("--mode", choices=["full", "head"], default="full",
+                        help="full: forward the whole network every epoch; head: train the classifier on cached backbone features")
+    parser.add_argument("--views", type=int, default=FEATURE_VIEWS,
+                        help="augmented train-set views to cache in head mode")
+    parser.add_argument("--precision", choices=precision_modes.MODES, default=PRECISION,
+                        help="compute dtype / memory layout; falls back to fp32 when unsupported")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="publish the new version to model/registry without rolling it out")
+    args = parser.parse_args()
+
+    if args.mode == "head":
+        train_head(args.views, args.precision, activate=not args.no_activate)
+    else:
+        train_model(args.precision, activate=not args.no_activate)
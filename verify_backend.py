@@ -1,12 +1,13 @@
 import sys
 import os
 
-# Add backend to path so we can import ml_utils
-sys.path.append(os.path.join(os.getcwd(), 'backend'))
+# Add project root to path so we can import the backend package
+sys.path.append(os.getcwd())
 
-from ml_utils import predictor
+from backend.ml_utils import predictor
 
 print("Testing Backend Predictor Logic...")
+predictor.load()
 print(f"Class names loaded: {len(predictor.class_names)}")
 print(f"First 5 classes: {predictor.class_names[:5]}")
 
@@ -16,6 +17,6 @@ if not os.path.exists(image_path):
     print(f"Error: {image_path} not found")
 else:
     print(f"\nPredicting on {image_path}...")
-    result, status_code = predictor.predict(image_path)
+    result = predictor.predict(image_path)
     print("\nPrediction Result:")
     print(result)